@@ -0,0 +1,91 @@
+import os
+import pickle
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_size=100000):
+        """
+            Least recently used cache with a size limit
+
+            max_size(int): maximum number of entries kept in the cache, 0 disables the cache
+
+            ---
+            get(key, default) -> value: returns the cached value of the key and counts the hit/miss
+            put(key, value) -> None: caches the value, evicting the least recently used entry if full
+            save(str, str) -> None: writes the cached entries with the fingerprint of their source to the given path
+            load(str, str) -> bool: warm loads the entries written by save with the same fingerprint from the given path
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+        # entries put while a journal dict is set are also recorded in it
+        self.journal = None
+
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+    def get(self, key, default=None):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        return default
+
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        if self.journal is not None:
+            self.journal[key] = value
+
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+    def clear(self):
+        self.entries.clear()
+        self.hits, self.misses = 0, 0
+
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.
+
+
+    def save(self, path, fingerprint=None):
+        # entries are written from the least to the most recently used one
+        with open(path, "wb") as file:
+            pickle.dump({"fingerprint": fingerprint, "entries": list(self.entries.items())}, file)
+
+
+    def load(self, path, fingerprint=None):
+        if not os.path.exists(path):
+            return False
+
+        with open(path, "rb") as file:
+            saved = pickle.load(file)
+
+        # entries computed from another source are stale
+        if not isinstance(saved, dict) or saved["fingerprint"] != fingerprint:
+            return False
+
+        for key, value in saved["entries"]:
+            self.put(key, value)
+
+        return True
@@ -0,0 +1,828 @@
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import tempfile
+import numpy as np
+from array import array
+from collections import Counter
+
+MODEL_MAGIC = b"TRLM"
+MODEL_VERSION = 1
+
+
+class StringTable:
+    def __init__(self, buffer, offsets, blob_offset):
+        """
+            Sorted strings stored as a single utf8 blob, searched without decoding the whole table
+
+            buffer(mmap|bytes): buffer holding the blob
+            offsets(np.ndarray): start of every string in the blob, followed by the end of the last one
+            blob_offset(int): start of the blob in the buffer
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+        self.blob_offset = blob_offset
+
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, i):
+        return self.encoded(i).decode("utf8")
+
+
+    def encoded(self, i):
+        start, end = self.offsets[i:i+2].tolist()
+        return self.buffer[self.blob_offset + start:self.blob_offset + end]
+
+
+    def index(self, string):
+        "Position of the string in the table, None if it is missing."
+        encoded = string.encode("utf8")
+
+        # utf8 bytes are ordered like the code points of the strings
+        i = bisect.bisect_left(_EncodedView(self), encoded)
+
+        if i < len(self) and self.encoded(i) == encoded:
+            return i
+
+        return None
+
+
+class _EncodedView:
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        return self.table.encoded(i)
+
+
+class Vocabulary:
+    def __init__(self, words):
+        """
+            Interning table mapping the words of the language model to integer ids
+
+            words(list): words of the vocabulary, ids are given in sorted order
+
+            ---
+            id(str) -> int: id of the word, None if the word is unknown
+            word(int) -> str: word of the id
+        """
+        self.words = sorted(set(words))
+        self.ids = {word: i for i, word in enumerate(self.words)}
+
+        # number of bits needed for a single word id in a packed key
+        self.bits = max(1, (len(self.words) - 1).bit_length())
+
+
+    def __len__(self):
+        return len(self.words)
+
+
+    def __iter__(self):
+        return iter(self.words)
+
+
+    def id(self, word):
+        return self.ids.get(word)
+
+
+    def word(self, i):
+        return self.words[i]
+
+
+class MappedVocabulary:
+    def __init__(self, table, bits):
+        """
+            Vocabulary read from a memory-mapped model, words are searched in the sorted string table
+            instead of being loaded into a dictionary
+
+            table(StringTable): sorted words of the vocabulary
+            bits(int): number of bits of a single word id in a packed key
+        """
+        self.table = table
+        self.bits = bits
+
+
+    def __len__(self):
+        return len(self.table)
+
+
+    def __iter__(self):
+        return (self.table[i] for i in range(len(self.table)))
+
+
+    def id(self, word):
+        return self.table.index(word)
+
+
+    def word(self, i):
+        return self.table[i]
+
+
+class MappedDeleteIndex:
+    def __init__(self, table, indptr, postings, vocab):
+        """
+            Symmetric delete index read from a memory-mapped model
+
+            table(StringTable): sorted delete variants
+            indptr(np.ndarray): start of the postings of every variant, followed by the end of the last one
+            postings(np.ndarray): ids of the vocabulary words of the variants
+            vocab(MappedVocabulary): vocabulary of the word ids
+        """
+        self.table = table
+        self.indptr = indptr
+        self.postings = postings
+        self.vocab = vocab
+        self.extra = {}
+
+
+    def __len__(self):
+        return len(self.table)
+
+
+    def get(self, variant, default=None):
+        i = self.table.index(variant)
+        if i is None:
+            return self.extra.get(variant, default)
+
+        start, end = self.indptr[i:i+2].tolist()
+        return [self.vocab.word(w) for w in self.postings[start:end].tolist()] + self.extra.get(variant, [])
+
+
+    def setdefault(self, variant, default):
+        "Postings of the variant added after the model is written, words of a new variant are kept aside."
+        return self.extra.setdefault(variant, default)
+
+
+class CompactNgramModel:
+    def __init__(self, vocab, order, keys, counts):
+        """
+            N-gram counts of a single order stored as sorted packed integer keys
+
+            vocab(Vocabulary): vocabulary interning the words of the n-grams
+            order(int): number of words in the n-grams
+            keys(np.ndarray): sorted uint64 keys, the word ids of an n-gram packed from left to right
+            counts(np.ndarray): counts of the keys
+
+            The model is looked up like the Counter it replaces: unigrams are keyed by the word and
+            higher orders by the tuple of the words. Counts added by update are kept in a Counter on
+            top of the arrays until the models are merged with merge_lang_models.
+        """
+        self.vocab = vocab
+        self.order = order
+        self.keys = keys
+        self.counts = counts
+        self.delta = Counter()
+        self.delta_successors = {}
+
+
+    def __len__(self):
+        return len(self.keys) + sum(1 for ngram in self.delta if self.__base_get__(ngram) is None)
+
+
+    def __iter__(self):
+        yield from (self.__unpack__(key) for key in self.keys.tolist())
+        yield from (ngram for ngram in self.delta if self.__base_get__(ngram) is None)
+
+
+    def __contains__(self, ngram):
+        return self.get(ngram) is not None
+
+
+    def __getitem__(self, ngram):
+        count = self.get(ngram)
+        return 0 if count is None else count
+
+
+    def __pack__(self, ngram):
+        words = (ngram,) if self.order == 1 else ngram
+
+        if len(words) != self.order:
+            return None
+
+        return self.__pack_words__(words)
+
+
+    def __pack_words__(self, words):
+        key = 0
+        for word in words:
+            i = self.vocab.id(word)
+            if i is None:
+                return None
+
+            key = (key << self.vocab.bits) | i
+
+        return key
+
+
+    def __unpack__(self, key):
+        mask  = (1 << self.vocab.bits) - 1
+        words = [self.vocab.word((key >> (self.vocab.bits * i)) & mask) for i in range(self.order - 1, -1, -1)]
+
+        return words[0] if self.order == 1 else tuple(words)
+
+
+    def __base_get__(self, ngram):
+        key = self.__pack__(ngram)
+        if key is None:
+            return None
+
+        # binary search over the sorted keys
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.counts[i].item()
+
+        return None
+
+
+    def __combine__(self, ngram, count, default):
+        delta = self.delta.get(ngram) if self.delta else None
+
+        if count is None and delta is None:
+            return default
+
+        return (count or 0) + (delta or 0)
+
+
+    def get(self, ngram, default=None):
+        return self.__combine__(ngram, self.__base_get__(ngram), default)
+
+
+    def update(self, counts):
+        "Adds the counts of the given n-grams on top of the arrays."
+        self.delta.update(counts)
+
+        if self.order > 1:
+            for ngram in counts:
+                self.delta_successors.setdefault(ngram[:-1], set()).add(ngram[-1])
+
+
+    def successors(self, context):
+        """
+            Words observed after the context with their counts. The keys of a context share their leading
+            bits, so its successors are a single range of the sorted keys.
+        """
+        prefix, found = self.__pack_words__(context), []
+
+        if prefix is not None and len(context) == self.order - 1:
+            bits = self.vocab.bits
+            low, high = prefix << bits, (prefix + 1) << bits
+
+            start = int(np.searchsorted(self.keys, np.uint64(low)))
+            end = int(np.searchsorted(self.keys, np.uint64(high))) if high < (1 << 64) else len(self.keys)
+            mask = (1 << bits) - 1
+
+            found = [(self.vocab.word(k & mask), c) for k, c in zip(self.keys[start:end].tolist(),
+                                                                    self.counts[start:end].tolist())]
+
+        # successors added by update
+        if self.delta:
+            found = [(word, self.get((*context, word))) for word, _ in found]
+            known = {word for word, _ in found}
+            found += [(word, self.get((*context, word))) for word in self.delta_successors.get(tuple(context), ())
+                      if word not in known]
+
+        return found
+
+
+    def get_many(self, ngrams, default=None):
+        "Looks up a batch of n-grams with a single vectorized binary search."
+        packed = [self.__pack__(ngram) for ngram in ngrams]
+        found  = [i for i, key in enumerate(packed) if key is not None]
+
+        counts = [None] * len(ngrams)
+        if len(found) > 0 and len(self.keys) > 0:
+            keys = np.array([packed[i] for i in found], dtype=np.uint64)
+            idx  = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            hits = self.keys[idx] == keys
+
+            for i, j, hit in zip(found, idx.tolist(), hits.tolist()):
+                if hit:
+                    counts[i] = self.counts[j].item()
+
+        return [self.__combine__(ngram, count, default) for ngram, count in zip(ngrams, counts)]
+
+
+    def items(self):
+        if not self.delta:
+            return zip(iter(self), self.counts.tolist())
+
+        return ((ngram, self[ngram]) for ngram in self)
+
+
+    def nbytes(self):
+        return self.keys.nbytes + self.counts.nbytes
+
+
+class CountMinSketch:
+    def __init__(self, order, width=1 << 20, depth=4):
+        """
+            Approximate n-gram counts of a single order kept in a fixed size count-min sketch
+
+            order(int): number of words in the n-grams
+            width(int): number of counters in every row
+            depth(int): number of rows, each n-gram is hashed into one counter per row
+
+            The count of an n-gram is the smallest of its counters, never lower than the exact count.
+            Counts are added with the conservative update, raising only the counters below the new
+            estimate. The n-grams themselves are not stored, so the sketch cannot be iterated.
+        """
+        self.order = order
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64)
+
+
+    def __contains__(self, ngram):
+        return self.get(ngram) is not None
+
+
+    def __getitem__(self, ngram):
+        count = self.get(ngram)
+        return count if count is not None else 0
+
+
+    def __cells__(self, ngram):
+        # blake2b keeps the cells stable across processes, unlike the builtin hash
+        key = "\x1f".join(ngram) if self.order > 1 else ngram
+        digest = hashlib.blake2b(key.encode("utf8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+
+    def get(self, ngram, default=None):
+        count = min(self.table[row, cell] for row, cell in enumerate(self.__cells__(ngram)))
+        return count.item() if count > 0 else default
+
+
+    def update(self, counts):
+        "Adds the counts of the given n-grams with the conservative update."
+        for ngram, count in counts.items():
+            cells = list(enumerate(self.__cells__(ngram)))
+            estimate = min(self.table[row, cell] for row, cell in cells) + count
+
+            for row, cell in cells:
+                if self.table[row, cell] < estimate:
+                    self.table[row, cell] = estimate
+
+
+    def scale(self, factor):
+        self.table *= factor
+
+
+    def nbytes(self):
+        return self.table.nbytes
+
+
+def merge_lang_models(lang_models, scale=1.):
+    """
+        Folds the updates of compact models into new arrays, the vocabulary is extended with the new words
+        and the old keys are repacked with their new ids
+
+        lang_models(list): compact language models of the orders 1 to n
+        scale(float): factor applied to every count while merging
+    """
+    old_vocab = lang_models[0].vocab
+    new_words = [ngram for ngram in lang_models[0].delta if old_vocab.id(ngram) is None]
+
+    if len(new_words) == 0 and scale == 1. and not any(m.delta for m in lang_models):
+        return lang_models
+
+    vocab = Vocabulary(list(old_vocab) + new_words)
+    ngram = len(lang_models)
+
+    if vocab.bits * ngram > 64:
+        raise ValueError(f"{ngram}-grams of {len(vocab)} words cannot be packed into 64 bit keys")
+
+    # ids stay in sorted order, so the repacked keys stay sorted too
+    remap = np.fromiter((vocab.ids[word] for word in old_vocab), dtype=np.uint64, count=len(old_vocab))
+    mask  = np.uint64((1 << old_vocab.bits) - 1)
+
+    merged = []
+    for lang_model in lang_models:
+        order = lang_model.order
+        model = CompactNgramModel(vocab, order, None, None)
+
+        keys = np.zeros(len(lang_model.keys), dtype=np.uint64)
+        for i in range(order - 1, -1, -1):
+            ids  = (lang_model.keys >> np.uint64(old_vocab.bits * i)) & mask
+            keys = (keys << np.uint64(vocab.bits)) | remap[ids]
+
+        delta_keys = np.fromiter((model.__pack__(ngram) for ngram in lang_model.delta), dtype=np.uint64,
+                                 count=len(lang_model.delta))
+        delta_counts = np.fromiter(lang_model.delta.values(), dtype=np.float64, count=len(lang_model.delta))
+
+        keys, inverse = np.unique(np.concatenate([keys, delta_keys]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([lang_model.counts, delta_counts]) * scale)
+
+        # counts stay integers unless they are decayed
+        integral = np.all(counts == np.round(counts)) and counts.max(initial=0) < 2 ** 32
+        model.keys, model.counts = keys, counts.astype(np.uint32) if integral else counts
+
+        merged.append(model)
+
+    return merged
+
+
+def build_successor_index(lang_model, index=None):
+    "Maps every context of the n-gram model to the words observed after it."
+    index = {} if index is None else index
+
+    for ngram in lang_model:
+        index.setdefault(ngram[:-1], []).append(ngram[-1])
+
+    return index
+
+
+def lookup_many(lang_model, ngrams):
+    "Counts of a batch of n-grams, None for the missing ones."
+    if hasattr(lang_model, "get_many"):
+        return lang_model.get_many(ngrams)
+
+    return [lang_model.get(ngram) for ngram in ngrams]
+
+
+def pack_ngrams(ids, order, bits):
+    "Packs every n-gram of the given order in the id sequence into a single uint64 key."
+    length = len(ids) - order + 1
+    keys = np.zeros(max(length, 0), dtype=np.uint64)
+
+    for i in range(order):
+        keys = (keys << np.uint64(bits)) | ids[i:i + length].astype(np.uint64)
+
+    return keys
+
+
+def build_compact_lang_models(tokens, ngram):
+    "Counts the n-grams of the token sequence into compact models of the orders 1 to `ngram`."
+    vocab = Vocabulary(tokens)
+
+    if vocab.bits * ngram > 64:
+        raise ValueError(f"{ngram}-grams of {len(vocab)} words cannot be packed into 64 bit keys")
+
+    ids = np.fromiter((vocab.ids[token] for token in tokens), dtype=np.uint64, count=len(tokens))
+
+    lang_models = []
+    for order in range(1, ngram + 1):
+        keys, counts = np.unique(pack_ngrams(ids, order, vocab.bits), return_counts=True)
+        lang_models.append(CompactNgramModel(vocab, order, keys, counts.astype(np.uint32)))
+
+    return lang_models
+
+
+def build_sketch_lang_models(tokens, ngram, width=1 << 20, depth=4, chunk_size=1 << 20):
+    """
+        Exact unigram Counter followed by count-min sketches of the higher orders. The n-grams are counted
+        chunk by chunk, so only the sketches and a single chunk are kept in memory.
+    """
+    lang_models = [Counter(tokens)]
+
+    for order in range(2, ngram + 1):
+        sketch = CountMinSketch(order, width, depth)
+
+        # consecutive chunks overlap by order-1 tokens, so every n-gram is counted exactly once
+        for start in range(0, max(len(tokens) - order + 1, 0), chunk_size):
+            chunk = tokens[start:start + chunk_size + order - 1]
+            sketch.update(Counter(zip(*[chunk[i:] for i in range(order)])))
+
+        lang_models.append(sketch)
+
+    return lang_models
+
+
+def read_chunks(path, chunk_size):
+    "Reads the text in chunks of about `chunk_size` characters, each cut at a whitespace so no token is split."
+    rest = ""
+
+    with open(path, encoding="utf8") as file:
+        while True:
+            text = file.read(chunk_size)
+            if not text:
+                break
+
+            text = rest + text
+            cut = len(text)
+            while cut > 0 and not text[cut-1].isspace():
+                cut -= 1
+
+            # a chunk without any whitespace is carried on until one is found
+            if cut > 0:
+                yield text[:cut]
+            rest = text[cut:]
+
+    if rest:
+        yield rest
+
+
+def chunk_ngrams(chunks, pattern, ngram):
+    """
+        N-gram counts of the orders 1 to `ngram` in every chunk of text. The last n-1 tokens of a chunk are
+        carried on to the next one, so the n-grams crossing a boundary are counted once in the later chunk.
+    """
+    carry = []
+
+    for text in chunks:
+        tokens, counts = carry + re.findall(pattern, text), []
+
+        for order in range(1, ngram + 1):
+            # only the n-grams ending in the new tokens
+            window = tokens[max(len(carry) - order + 1, 0):]
+            counts.append(Counter(window) if order == 1 else Counter(zip(*[window[i:] for i in range(order)])))
+
+        carry = tokens[-(ngram - 1):] if ngram > 1 else []
+        yield counts
+
+
+def __ngram_key__(ngram):
+    # a space sorts before every token character, so the keys sort like the tuples of words
+    return ngram if isinstance(ngram, str) else " ".join(ngram)
+
+
+def spill_counts(counts, tmp_dir=None):
+    "Writes the counts into a temporary file as `key<TAB>count` lines sorted by key, returns its path."
+    with tempfile.NamedTemporaryFile("w", encoding="utf8", dir=tmp_dir, suffix=".ngrams", delete=False) as file:
+        for key, count in sorted((__ngram_key__(ngram), count) for ngram, count in counts.items()):
+            file.write(f"{key}\t{count}\n")
+
+    return file.name
+
+
+def merge_spills(paths):
+    "Merges the sorted files of spill_counts into a single sorted stream of (key, count), summing the counts of a key."
+    files = [open(path, encoding="utf8") for path in paths]
+
+    try:
+        lines = heapq.merge(*[(line.rstrip("\n").split("\t") for line in file) for file in files],
+                            key=lambda line: line[0])
+        key, total = None, 0
+
+        for line_key, count in lines:
+            if line_key != key:
+                if key is not None:
+                    yield key, total
+                key, total = line_key, 0
+
+            total += int(count)
+
+        if key is not None:
+            yield key, total
+
+    finally:
+        for file in files:
+            file.close()
+
+
+def build_lang_models_external(path, pattern, ngram, backend="counter", chunk_size=1 << 24, spill_size=1 << 21,
+                               tmp_dir=None, width=1 << 20, depth=4):
+    """
+        Builds the language models of a corpus file in bounded memory. The corpus is read and counted chunk by
+        chunk, the partial counts are spilled into sorted temporary files once they hold `spill_size` n-grams
+        and the files of every order are merged into the final model.
+
+        path(str): path for the corpus file
+        pattern(str): regular expression of the tokens
+        ngram(int): order of the language model
+        backend(str): storage of the language model. Opt: counter/compact/sketch
+        chunk_size(int): number of characters read at once
+        spill_size(int): number of n-grams counted in memory before they are spilled
+        tmp_dir(str): directory of the temporary files, None for the default one
+        width(int), depth(int): size of the sketches of the sketch backend
+    """
+    chunks = chunk_ngrams(read_chunks(path, chunk_size), pattern, ngram)
+
+    # sketches are bounded by themselves, only the unigrams are kept exactly
+    if backend == "sketch":
+        lang_models = [Counter()] + [CountMinSketch(order, width, depth) for order in range(2, ngram + 1)]
+
+        for counts in chunks:
+            for lang_model, ngrams in zip(lang_models, counts):
+                lang_model.update(ngrams)
+
+        return lang_models
+
+    if backend not in ("counter", "compact"):
+        raise Exception("Invalid language model backend")
+
+    spills = [[] for _ in range(ngram)]
+    partial = [Counter() for _ in range(ngram)]
+
+    try:
+        for counts in chunks:
+            for part, ngrams in zip(partial, counts):
+                part.update(ngrams)
+
+            if sum(len(part) for part in partial) >= spill_size:
+                for files, part in zip(spills, partial):
+                    files.append(spill_counts(part, tmp_dir))
+                    part.clear()
+
+        for files, part in zip(spills, partial):
+            if part:
+                files.append(spill_counts(part, tmp_dir))
+                part.clear()
+
+        if backend == "counter":
+            lang_models = [Counter(dict(merge_spills(spills[0])))]
+
+            # the words of the higher orders share the strings of the unigrams
+            words = {word: word for word in lang_models[0]}
+            for files in spills[1:]:
+                lang_models.append(Counter({tuple(words[word] for word in key.split(" ")): count
+                                            for key, count in merge_spills(files)}))
+
+            return lang_models
+
+        # the merged keys come in the order of the word ids, so the packed keys are already sorted
+        words, counts = zip(*merge_spills(spills[0])) if spills[0] else ((), ())
+        vocab = Vocabulary(words)
+
+        if vocab.bits * ngram > 64:
+            raise ValueError(f"{ngram}-grams of {len(vocab)} words cannot be packed into 64 bit keys")
+
+        lang_models = [CompactNgramModel(vocab, 1, np.arange(len(words), dtype=np.uint64),
+                                         np.array(counts, dtype=np.uint32))]
+
+        for order in range(2, ngram + 1):
+            model = CompactNgramModel(vocab, order, None, None)
+            keys, counts = array("Q"), array("I")
+
+            for key, count in merge_spills(spills[order - 1]):
+                keys.append(model.__pack_words__(key.split(" ")))
+                counts.append(count)
+
+            model.keys = np.array(keys, dtype=np.uint64)
+            model.counts = np.array(counts, dtype=np.uint32)
+            lang_models.append(model)
+
+        return lang_models
+
+    finally:
+        for files in spills:
+            for file in files:
+                os.remove(file)
+
+
+def corpus_stamp(path):
+    "Size, modification time and sha256 hash of the corpus the model is built from."
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(chunk)
+
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256.hexdigest()}
+
+
+def is_stale(header, corpus_path):
+    "Checks whether the model is built from another version of the corpus."
+    if header is None or header["version"] != MODEL_VERSION:
+        return True
+
+    # a prebuilt model can be shipped without its corpus
+    if not os.path.exists(corpus_path):
+        return False
+
+    # hashing is only needed when the file is touched since the build
+    stat, stamp = os.stat(corpus_path), header["corpus"]
+    if stat.st_size == stamp["size"] and stat.st_mtime_ns == stamp["mtime_ns"]:
+        return False
+
+    return corpus_stamp(corpus_path)["sha256"] != stamp["sha256"]
+
+
+def __encode_strings__(strings):
+    encoded = [s.encode("utf8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def compact_lang_models(lang_models, scale=1.):
+    "Converts Counter language models into compact models sharing a single vocabulary, scaling every count."
+    if isinstance(lang_models[0], CompactNgramModel):
+        return merge_lang_models(lang_models, scale)
+
+    vocab = Vocabulary(lang_models[0])
+    ngram = len(lang_models)
+
+    if vocab.bits * ngram > 64:
+        raise ValueError(f"{ngram}-grams of {len(vocab)} words cannot be packed into 64 bit keys")
+
+    compact = []
+    for order, lang_model in enumerate(lang_models, 1):
+        model = CompactNgramModel(vocab, order, None, None)
+        keys  = np.fromiter((model.__pack__(ngram) for ngram in lang_model), dtype=np.uint64, count=len(lang_model))
+        counts = np.array(list(lang_model.values())) * scale
+
+        # counts stay integers unless they are decayed
+        integral = np.all(counts == np.round(counts)) and counts.max(initial=0) < 2 ** 32
+        counts = counts.astype(np.uint32) if integral else counts
+
+        order_idx = np.argsort(keys)
+        model.keys, model.counts = keys[order_idx], counts[order_idx]
+        compact.append(model)
+
+    return compact
+
+
+def save_lang_model(path, lang_models, delete_index, stamp, max_distance, updates=""):
+    """
+        Writes the vocabulary, the n-gram tables and the delete index into a versioned binary file
+
+        path(str): path of the model file
+        lang_models(list): compact language models of the orders 1 to n
+        delete_index(dict): delete variants mapped to the vocabulary words
+        stamp(dict): stamp of the corpus the model is built from
+        max_distance(int): number of deletes the index is built with
+        updates(str): stamp of the texts added into the model after it is built from the corpus
+    """
+    vocab = lang_models[0].vocab
+    variants = sorted(delete_index)
+
+    arrays = {}
+    arrays["vocab_blob"], arrays["vocab_offsets"] = __encode_strings__(vocab)
+    arrays["delete_blob"], arrays["delete_offsets"] = __encode_strings__(variants)
+
+    postings = [[vocab.id(w) for w in delete_index[v]] for v in variants]
+    arrays["delete_indptr"] = np.zeros(len(postings) + 1, dtype=np.uint64)
+    arrays["delete_indptr"][1:] = np.cumsum([len(p) for p in postings])
+    arrays["delete_postings"] = np.fromiter((w for p in postings for w in p), dtype=np.uint32)
+
+    for lang_model in lang_models:
+        arrays[f"keys_{lang_model.order}"] = lang_model.keys
+        arrays[f"counts_{lang_model.order}"] = lang_model.counts
+
+    # arrays are laid out after the header, aligned to 8 bytes
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [offset, array.dtype.str, len(array)]
+        offset += -(-array.nbytes // 8) * 8
+
+    header = {"version": MODEL_VERSION, "corpus": stamp, "ngram": len(lang_models), "bits": vocab.bits,
+              "max_distance": max_distance, "updates": updates, "arrays": layout}
+    header = json.dumps(header).encode("utf8")
+    header += b" " * (-(len(MODEL_MAGIC) + 8 + len(header)) % 8)
+
+    # writing next to the model and replacing it, a model mapped by a running process stays intact
+    with open(path + ".tmp", "wb") as file:
+        file.write(MODEL_MAGIC)
+        file.write(np.uint64(len(header)).tobytes())
+        file.write(header)
+
+        for array in arrays.values():
+            data = np.ascontiguousarray(array).tobytes()
+            file.write(data + b"\0" * (-len(data) % 8))
+
+    os.replace(path + ".tmp", path)
+
+
+def read_header(path):
+    "Header of the model file, None if the file is missing or not a model."
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as file:
+        if file.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+            return None
+
+        size = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+        return json.loads(file.read(size))
+
+
+def load_lang_model(path):
+    "Memory maps the model file, returning its header, the compact language models and the delete index."
+    header = read_header(path)
+
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # arrays start right after the padded header
+    start = len(MODEL_MAGIC) + 8 + int(np.frombuffer(buffer, dtype=np.uint64, count=1, offset=len(MODEL_MAGIC))[0])
+
+    def array(name):
+        offset, dtype, length = header["arrays"][name]
+        return np.frombuffer(buffer, dtype=dtype, count=length, offset=start + offset)
+
+    def table(name):
+        return StringTable(buffer, array(f"{name}_offsets"), start + header["arrays"][f"{name}_blob"][0])
+
+    vocab = MappedVocabulary(table("vocab"), header["bits"])
+    lang_models = [CompactNgramModel(vocab, order, array(f"keys_{order}"), array(f"counts_{order}"))
+                   for order in range(1, header["ngram"] + 1)]
+
+    delete_index = MappedDeleteIndex(table("delete"), array("delete_indptr"), array("delete_postings"), vocab)
+
+    return header, lang_models, delete_index
@@ -1,5 +1,5 @@
 from stemmer import TurkishStemmer
-from normalizer import TurkishNormalizer
+from normalizer import TurkishNormalizer, save_corrections
 from stopword import TurkishStopwordRemover
 from ml_based_tokenizer import MlBasedTokenizer
 from ml_based_splitter import MlBasedSentenceSplitter
@@ -8,6 +8,8 @@ from rule_based_splitter import RuleBasedSentenceSplitter
 
 import argparse
 import os
+import re
+import sys
 
 # Importing docx library for Word documents
 try:
@@ -28,6 +30,29 @@ parser.add_argument('-train_corpus_path', default="./data/train.conllu", type=st
 parser.add_argument('-stopword_path', default="./data/stopword_lexicon.txt", type=str, help="path of the static stopword lexicon file")
 
 parser.add_argument('-ngram', default=3, type=int,   help="ngram for the language model in the normalizer")
+parser.add_argument('-lm_backend', default="counter", type=str, help="storage of the language model in the normalizer. Opt: counter/compact/sketch")
+parser.add_argument('-model_path', default=None, type=str, help="path of the prebuilt binary language model for the normalizer")
+parser.add_argument('-decoding', default="greedy", type=str, help="decoding strategy of the normalizer. Opt: greedy/beam")
+parser.add_argument('-beam_width', default=5, type=int, help="number of hypotheses kept by the beam search of the normalizer")
+parser.add_argument('-candidate_engine', default="symdelete", type=str, help="candidate search of the normalizer. Opt: symdelete/trie")
+parser.add_argument('-update_path', default=None, type=str, help="path of new text added into the language model of the normalizer")
+parser.add_argument('-decay', default=None, type=float, help="factor for fading the old counts of the language model when new text is added")
+parser.add_argument('-workers', default=1, type=int, help="number of processes used by the normalizer")
+parser.add_argument('-cache_size', default=100000, type=int, help="number of normalization results cached in the normalizer")
+parser.add_argument('-known_threshold', default=None, type=float, help="unigram count from which the normalizer keeps a word as it is")
+parser.add_argument('-use_lexicon', help="keep the words of the lexicon as they are in the normalizer", action='store_true')
+parser.add_argument('-no_ascii_folding', help="disable restoring the diacritics typed as ASCII before the edit search of the normalizer", action='store_true')
+parser.add_argument('-corrections_path', default=None, type=str, help="path of the correction table mined for the normalizer")
+parser.add_argument('-mine_path', default=None, type=str, help="path of the text mined for the correction table, the corpus by default")
+parser.add_argument('-sentence_budget', default=None, type=int, help="number of candidates the normalizer examines in a sentence before degrading its search")
+parser.add_argument('-deadline', default=None, type=float, help="seconds the normalizer spends on a sentence before degrading its search")
+parser.add_argument('-sketch_width', default=1 << 20, type=int, help="number of counters in every row of the sketches of the normalizer")
+parser.add_argument('-sketch_depth', default=4, type=int, help="number of rows of the sketches of the normalizer")
+parser.add_argument('-stream_chunk_size', default=None, type=int, help="number of characters of the corpus counted at once when building the language model of the normalizer")
+parser.add_argument('-cache_path', default=None, type=str, help="path for persisting the normalization cache between runs")
+parser.add_argument('-prefix_pruning', help="strip only the suffixes leaving a lexicon word as a prefix in the stemmer", action='store_true')
+parser.add_argument('-stemmer_artifact_path', default=None, type=str, help="path of the compiled suffixes and lexicon of the stemmer")
+parser.add_argument('-stem_cache_size', default=100000, type=int, help="number of stems cached in the stemmer")
 parser.add_argument('-do_train', default=False, help="train the ml based tokenizer and sentence splitter")
 
 parser.add_argument('-stem', help="apply stemming in the given files", action='store_true')
@@ -38,6 +63,10 @@ parser.add_argument('-ml_tokenize', help="tokenize the given files using ml base
 parser.add_argument('-rule_tokenize', help="tokenize the given files using rule based tokenizer", action='store_true')
 parser.add_argument('-ml_split', help="split the given files using ml based sentence splitter", action='store_true')
 parser.add_argument('-rule_split', help="split the given files using rule based sentence splitter", action='store_true')
+parser.add_argument('-build_model', help="build the binary language model of the normalizer into the model path", action='store_true')
+parser.add_argument('-build_corrections', help="mine the correction table of the normalizer into the corrections path", action='store_true')
+parser.add_argument('-build_stemmer', help="compile the suffixes and lexicon of the stemmer into the stemmer artifact path", action='store_true')
+parser.add_argument('-benchmark_sketch', help="compare the sketch backend of the normalizer with the exact language model", action='store_true')
 parser.add_argument('-interact', help="starts interactive application", action='store_true')
 parser.add_argument('-save', help="saving the files according to the given format", action='store_true')
 
@@ -71,6 +100,35 @@ def read_file(path: str, fname: str) -> [str]:
     return pre_str
 
 
+def counter_bytes(counter) -> int:
+    # the words themselves are shared with the vocabulary, only the tuples and the counts are counted
+    return sys.getsizeof(counter) + sum(sys.getsizeof(ngram) + sys.getsizeof(count) for ngram, count in counter.items())
+
+
+def benchmark_sketch(n_sentences: int = 1000) -> None:
+    exact  = TurkishNormalizer(args.corpus_path, args.lexicon_path, ngram = args.ngram, cache_size = 0)
+    sketch = TurkishNormalizer(args.corpus_path, args.lexicon_path, ngram = args.ngram, cache_size = 0, lm_backend = "sketch",
+                               sketch_width = args.sketch_width, sketch_depth = args.sketch_depth)
+
+    for n in range(1, args.ngram):
+        exact_model, sketch_model = exact.lang_models[n], sketch.lang_models[n]
+        errors = [sketch_model[ngram] - count for ngram, count in exact_model.items()]
+
+        print(f">> {n+1}-grams: {len(exact_model)} n-grams")
+        print(f"   memory: exact {counter_bytes(exact_model) / 2**20:.1f} MB, sketch {sketch_model.nbytes() / 2**20:.1f} MB")
+        print(f"   counts: {sum(e == 0 for e in errors) / len(errors):.2%} exact, mean overestimate {sum(errors) / len(errors):.3f}")
+
+    with open(args.corpus_path, encoding="utf8") as file:
+        sentences = re.findall(r"<s>(.*?)<\\s>", file.read())[:n_sentences]
+
+    exact_sents  = [exact.normalize_sentence(sent).split() for sent in sentences]
+    sketch_sents = [sketch.normalize_sentence(sent).split() for sent in sentences]
+
+    same  = sum(a == b for e, s in zip(exact_sents, sketch_sents) for a, b in zip(e, s))
+    total = sum(len(e) for e in exact_sents)
+    print(f">> normalization: {same / total:.2%} of {total} tokens are the same as with the exact model")
+
+
 def interact(normalizer: TurkishNormalizer, stemmer: TurkishStemmer, stopwordRemover: TurkishStopwordRemover, mlBasedTokenizer: MlBasedTokenizer, ruleBasedTokenizer:RuleBasedTokenizer, mlBasedSplitter: MlBasedSentenceSplitter, ruleBasedSplitter: RuleBasedSentenceSplitter) -> None:
     menu = "\t[mt]lBasedTokenize\n\t[rt]uleBasedTokenize\n\t[ms]lBasedSplit\n\t[rs]uleBasedSplit\n\t[n]ormalize\n\t[s]tem\n\tstop[w]ord\n\t[a]ll\n\t[e]xit\n>> Selection: "
     opt = input(menu)
@@ -128,12 +186,66 @@ def interact(normalizer: TurkishNormalizer, stemmer: TurkishStemmer, stopwordRem
             
 
 if __name__ == "__main__":
+    normalizer_args = {"ngram": args.ngram, "cache_size": args.cache_size, "cache_path": args.cache_path,
+                       "lm_backend": args.lm_backend, "model_path": args.model_path, "decoding": args.decoding,
+                       "beam_width": args.beam_width, "candidate_engine": args.candidate_engine,
+                       "known_threshold": args.known_threshold, "use_lexicon": args.use_lexicon,
+                       "ascii_folding": not args.no_ascii_folding, "corrections_path": args.corrections_path,
+                       "sentence_budget": args.sentence_budget, "deadline": args.deadline,
+                       "sketch_width": args.sketch_width, "sketch_depth": args.sketch_depth,
+                       "stream_chunk_size": args.stream_chunk_size}
+
+    if args.build_model:
+        if args.model_path is None:
+            parser.error("-build_model requires -model_path")
+
+        normalizer = TurkishNormalizer(args.corpus_path, args.lexicon_path, ngram = args.ngram, lm_backend = "compact",
+                                       stream_chunk_size = args.stream_chunk_size)
+        normalizer.save_model(args.model_path)
+        exit()
+
+    if args.build_stemmer:
+        if args.stemmer_artifact_path is None:
+            parser.error("-build_stemmer requires -stemmer_artifact_path")
+
+        stemmer = TurkishStemmer(args.lexicon_path, args.grammar_path, prefix_pruning = args.prefix_pruning)
+        stemmer.save_artifact(args.stemmer_artifact_path)
+        exit()
+
+    if args.benchmark_sketch:
+        benchmark_sketch()
+        exit()
+
+    if args.build_corrections:
+        if args.corrections_path is None:
+            parser.error("-build_corrections requires -corrections_path")
+
+        # mining with the runtime settings, except for the table being written and the cached results
+        normalizer = TurkishNormalizer(args.corpus_path, args.lexicon_path,
+                                       **{**normalizer_args, "corrections_path": None, "cache_path": None})
+
+        with open(args.mine_path or args.corpus_path, encoding="utf8") as file:
+            corrections = normalizer.mine_corrections(file.read().split("\n"))
+
+        save_corrections(args.corrections_path, corrections)
+        print(f">> {len(corrections)} corrections are written to {args.corrections_path}")
+        exit()
+
     mlTokenizer = MlBasedTokenizer(args.train_corpus_path, args.do_train)
     ruleTokenizer = RuleBasedTokenizer()
     mlSplitter = MlBasedSentenceSplitter(args.train_corpus_path, args.do_train)
     ruleSplitter = RuleBasedSentenceSplitter()
-    normalizer = TurkishNormalizer(args.corpus_path, args.lexicon_path, ngram = args.ngram)
-    stemmer    = TurkishStemmer(args.lexicon_path, args.grammar_path)
+    normalizer = TurkishNormalizer(args.corpus_path, args.lexicon_path, **normalizer_args)
+    stemmer    = TurkishStemmer(args.lexicon_path, args.grammar_path, prefix_pruning = args.prefix_pruning,
+                                cache_size = args.stem_cache_size, artifact_path = args.stemmer_artifact_path)
+
+    # extending the language model with new text, the model file is rewritten to keep it
+    if args.update_path is not None:
+        normalizer.update_from_file(args.update_path, decay = args.decay)
+
+        if args.model_path is not None:
+            normalizer.save_model(args.model_path)
+
     stopwordRemover = TurkishStopwordRemover(args.stopword_path, args.corpus_path, use_dynamic=True)
     
     if args.interact:
@@ -161,10 +273,10 @@ if __name__ == "__main__":
 
             # applying related functionalities
             if args.stem and not args.normalize : 
-                pro_str = [stemmer.stem_sentence(sent) for sent in pre_str]
+                pro_str = stemmer.stem_batch(pre_str)
 
             elif not args.stem and args.normalize:
-                pro_str = [normalizer.normalize_sentence(sent) for sent in pre_str]
+                pro_str = normalizer.normalize_parallel(pre_str, workers = args.workers)
             
             elif args.ml_tokenize:
                 pro_str = [mlTokenizer.tokenize(sent) for sent in pre_str]
@@ -183,10 +295,13 @@ if __name__ == "__main__":
                 pro_str = ["\n".join(sent) for sent in pro_str]
 
             else:
-                pro_str = [normalizer.normalize_sentence(sent) for sent in pre_str]
-                pro_str = [stemmer.stem_sentence(sent) for sent in pro_str]
+                pro_str = normalizer.normalize_parallel(pre_str, workers = args.workers)
+                pro_str = stemmer.stem_batch(pro_str)
                 pro_str = [stopwordRemover.remove_stopwords(sent) for sent in pro_str]
             
             # saving the file
             if args.save is not None:
                 save_file("\n".join(pro_str), path, fname)
+
+    # persisting the normalization results for the next runs
+    normalizer.save_cache()
@@ -0,0 +1,103 @@
+import json
+from trie import Trie
+
+
+def read_rules(path, use_derivational=True):
+    "Ordered (suffix, category) pairs of a rule file mapping every category to its suffixes, dashes removed."
+    with open(path, encoding="utf8") as file:
+        rules = json.load(file)
+
+    # deciding to include derivational suffixes
+    return [(suffix.replace("-", ""), rule) for rule in rules if rule != "Derivational" or use_derivational
+                                            for suffix in rules[rule]]
+
+
+class MorphologyFST:
+    def __init__(self, suffixes, lexicon, prefix_index=False):
+        """
+            Suffix transducer of the stemmer, compiled from the suffix rules and the lexicon
+
+            suffixes(list): (suffix, category) pairs in the order they are preferred
+            lexicon(iterable): words accepted as roots
+            prefix_index(bool): keeping the lexicon in a trie for finding the roots that are prefixes of a token
+
+            The suffixes are written backwards into a character trie, so a single walk from any offset of a
+            token to its start emits every suffix ending at the offset. The transducer holds only builtin
+            containers and is pickled inside the stemmer artifact.
+
+            ---
+            suffixes_at(str, int) -> list: function for finding the (rank, length, category) of the suffixes ending at an offset
+            root_ends(str) -> list: function for finding the lengths of the prefixes of a token that are roots
+            analyze(str, bool) -> str|(str, list): function for stemming a token, with its stripped suffixes if asked
+        """
+        self.lexicon = lexicon
+        self.categories = {}
+        self.root = {}
+
+        for rank, (suffix, category) in enumerate(suffixes):
+            if len(suffix) == 0:
+                continue
+
+            self.categories.setdefault(suffix, [])
+            if category not in self.categories[suffix]:
+                self.categories[suffix].append(category)
+
+            node = self.root
+            for char in reversed(suffix):
+                node = node.setdefault(char, {})
+
+            node.setdefault(None, []).append((rank, len(suffix), category))
+
+        self.max_suffix_len = max([len(s) for s in self.categories], default=0)
+        self.prefixes = Trie(self.lexicon) if prefix_index else None
+
+
+    def suffixes_at(self, token, end=None):
+        "Suffixes ending at the offset `end` of the token as (rank, length, category), in the order they are preferred."
+        end = len(token) if end is None else end
+        node, found = self.root, []
+
+        for i in range(end - 1, -1, -1):
+            node = node.get(token[i])
+            if node is None:
+                break
+
+            found += node.get(None, [])
+
+        return sorted(found)
+
+
+    def root_ends(self, token):
+        return self.prefixes.prefix_ends(token)
+
+
+    def analyze(self, token, with_suffixes=False, min_suffix_len=2, prune=False):
+        """
+            Strips the longest suffix of at least `min_suffix_len` letters until the token is a root. With `prune`,
+            only the suffixes leaving a root as a prefix of the token are stripped, and none if there is no such root.
+
+            Returns the stem, or the stem with the stripped (suffix, categories) pairs, the last suffix first.
+        """
+        stripped, end = [], len(token)
+
+        while token[:end] not in self.lexicon:
+            shortest = 0
+            if prune:
+                ends = self.root_ends(token[:end])
+
+                # no root can be reached by stripping suffixes
+                if len(ends) == 0:
+                    break
+
+                shortest = ends[0]
+
+            lengths = [length for _, length, _ in self.suffixes_at(token, end)
+                       if length >= min_suffix_len and end - length >= shortest]
+            if len(lengths) == 0:
+                break
+
+            suffix = token[end - max(lengths):end]
+            stripped.append((suffix, self.categories[suffix]))
+            end -= len(suffix)
+
+        return (token[:end], stripped) if with_suffixes else token[:end]
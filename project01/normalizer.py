@@ -1,33 +1,290 @@
 import re
+import os
+import math
+import hashlib
+import itertools
+import time
+import multiprocessing
 from collections import Counter
+from cache import LRUCache
+from trie import Trie
+from language_model import build_compact_lang_models, build_lang_models_external, build_sketch_lang_models, \
+                           build_successor_index, compact_lang_models, corpus_stamp, is_stale, load_lang_model, lookup_many, \
+                           merge_lang_models, read_header, save_lang_model
+
+LETTERS = 'abcçdefgğhijklmnoöpqrsştuüvwxyz'
+TOKENS  = "\w+|<s>|<\\\s>"
+FOLDING = str.maketrans("çğıöşüÇĞİÖŞÜ", "cgiosuCGIOSU")
+VARIANT_COST = 1 / 16
+
 
 # This code is written based on Peter Norvig's spell corrector: https://norvig.com/spell-correct.html
 def edits1(word):
     "All edits that are one edit away from `word`."
-    letters    = 'abcçdefgğhijklmnoöpqrsştuüvwxyz'
     splits     = [(word[:i], word[i:])    for i in range(len(word) + 1)]
     deletes    = [L + R[1:]               for L, R in splits if R]
     transposes = [L + R[1] + R[0] + R[2:] for L, R in splits if len(R)>1]
-    replaces   = [L + c + R[1:]           for L, R in splits if R for c in letters]
-    inserts    = [L + c + R               for L, R in splits for c in letters]
+    replaces   = [L + c + R[1:]           for L, R in splits if R for c in LETTERS]
+    inserts    = [L + c + R               for L, R in splits for c in LETTERS]
     return set(deletes + transposes + replaces + inserts)
 
 
+def deletes(word, max_distance):
+    "All strings that are obtained by deleting up to `max_distance` letters from `word`."
+    variants = frontier = {word}
+
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i+1:] for w in frontier for i in range(len(w))}
+        variants = variants | frontier
+
+    return variants
+
+
+def edit_distance(source, target, max_distance):
+    """
+        Optimal string alignment distance between `source` and `target` restricted to the edits
+        produced by `edits1`, i.e. only the LETTERS can be inserted or replaced into `source`.
+        Returns `max_distance + 1` as soon as the distance is known to exceed `max_distance`.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    inf  = max_distance + 1
+    prev = None
+    curr = [j if all(c in LETTERS for c in target[:j]) else inf for j in range(len(target) + 1)]
+
+    for i in range(1, len(source) + 1):
+        before, prev, curr = prev, curr, [i] + [inf] * len(target)
+
+        for j in range(1, len(target) + 1):
+            s, t = source[i-1], target[j-1]
+            cost = 0 if s == t else (1 if t in LETTERS else inf)
+
+            curr[j] = min(prev[j] + 1,                                # deletion
+                          curr[j-1] + 1 if t in LETTERS else inf,     # insertion
+                          prev[j-1] + cost)                           # replacement
+
+            # transposition
+            if i > 1 and j > 1 and s == target[j-2] and source[i-2] == t:
+                curr[j] = min(curr[j], before[j-2] + 1)
+
+        if min(curr) > max_distance:
+            return inf
+
+    return min(curr[-1], inf)
+
+
+def build_delete_index(words, max_distance, delete_index=None):
+    "Symmetric delete index: every delete variant of a vocabulary word points back to the word."
+    delete_index = {} if delete_index is None else delete_index
+
+    for word in words:
+        for variant in deletes(word, max_distance):
+            delete_index.setdefault(variant, []).append(word)
+
+    return delete_index
+
+
+def fold_ascii(word):
+    "Key of `word` with the Turkish diacritics typed as ASCII and the letters lowercased."
+    return word.translate(FOLDING).lower()
+
+
+def build_ascii_index(words, ascii_index=None):
+    "Maps the ASCII folded key of every vocabulary word with a diacritic to its real spellings."
+    ascii_index = {} if ascii_index is None else ascii_index
+
+    for word in words:
+        key = fold_ascii(word)
+
+        # a word without diacritics is its own key and found in the vocabulary directly
+        if key != word:
+            ascii_index.setdefault(key, []).append(word)
+
+    return ascii_index
+
+
+def save_corrections(path, corrections):
+    "Writes the correction table as `word<TAB>correction` lines."
+    with open(path, "w", encoding="utf8") as file:
+        for word, correction in sorted(corrections.items()):
+            file.write(f"{word}\t{correction}\n")
+
+
+def load_corrections(path):
+    with open(path, encoding="utf8") as file:
+        return dict(line.rstrip("\n").split("\t") for line in file if "\t" in line)
+
+
+# normalizer of the worker processes, forked workers inherit it copy-on-write from the parent
+_worker_normalizer = None
+
+
+def _init_worker(normalizer):
+    global _worker_normalizer
+    _worker_normalizer = normalizer
+
+
+def _normalize_chunk(sentences):
+    # the results cached and counted by the worker are sent back with the sentences
+    normalizer, stats = _worker_normalizer, _worker_normalizer.stats.copy()
+    normalizer.cache.journal = {}
+
+    try:
+        sentences = normalizer.normalize_batch(sentences)
+        return sentences, normalizer.cache.journal, normalizer.stats - stats
+    finally:
+        normalizer.cache.journal = None
+
+
 class TurkishNormalizer:
-    def __init__(self, corpus_path, lexicon_path, ngram=1):
+    def __init__(self, corpus_path, lexicon_path, ngram=1, max_distance=2, candidate_budget=None,
+                 cache_size=100000, cache_path=None, lm_backend="counter", model_path=None,
+                 decoding="greedy", beam_width=5, backoff=0.4, edit_penalty=0.1, candidate_engine="symdelete",
+                 known_threshold=None, use_lexicon=False, ascii_folding=True, corrections_path=None,
+                 sentence_budget=None, deadline=None, sketch_width=1 << 20, sketch_depth=4, stream_chunk_size=None):
+        """
+            Main Class for applying Turkish Normalizer
+
+            corpus_path(str): path for the corpus file of the language model
+            lexicon_path(str): path for the lexicon file
+            ngram(int): order of the language model
+            max_distance(int): maximum edit distance of the candidates
+            candidate_budget(int|list): maximum number of candidates examined in each distance tier, or one
+                                        budget per tier with the last one reused for the deeper tiers;
+                                        None for no limit
+            cache_size(int): maximum number of normalization results kept in memory, 0 disables caching
+            cache_path(str): path for persisting the cache, warm loaded at startup if it is saved from the same
+                             corpus, updates and settings
+            lm_backend(str): storage of the language model, sketch keeps approximate counts of the higher orders
+                             in a fixed memory. Opt: counter/compact/sketch
+            model_path(str): path for the prebuilt binary language model, memory-mapped with the compact backend
+                             and rebuilt from the corpus when it is missing or stale
+            decoding(str): strategy of normalize_sentence. Opt: greedy/beam
+            beam_width(int): number of hypotheses kept by the beam search
+            backoff(float): weight of a lower order in the stupid backoff scores of the beam search
+            edit_penalty(float): weight of a single edit between a word and its candidate in the beam search
+            candidate_engine(str): search of the candidates in the vocabulary. Opt: symdelete/trie
+            known_threshold(float): unigram count from which a word is returned as it is without searching
+                                    its candidates, None disables the threshold
+            use_lexicon(bool): returning the words of the lexicon as they are without searching their candidates
+            ascii_folding(bool): looking up the spellings of a word typed without its diacritics before the edit search
+            corrections_path(str): path for the correction table written by mine_corrections, its words are
+                                   answered from the table without searching their candidates
+            sentence_budget(int): number of candidates examined in a sentence before the search falls back to
+                                  distance 1, and to the words themselves at twice the number; None for no limit
+            deadline(float): seconds spent on a sentence before the search falls back like sentence_budget
+            sketch_width(int): number of counters in every row of the sketches of the sketch backend
+            sketch_depth(int): number of rows of the sketches of the sketch backend
+            stream_chunk_size(int): number of characters of the corpus counted at once, the partial counts are
+                                    merged through temporary files; None reads the whole corpus into memory
+
+            ---
+            normalize(str) -> str: function for normalizing single token
+            normalize_sentence(str) -> str: function for normalizing all tokens in the given sentence
+            normalize_sentence_report(str) -> (str, list): function for normalizing a sentence and finding the
+                                                           positions of the tokens degraded by the budget
+            normalize_batch(list) -> list: function for normalizing a batch of sentences
+            normalize_parallel(list, int) -> list: function for normalizing sentences over worker processes
+            save_cache() -> None: function for writing the cached results to the cache path
+            save_model(str) -> None: function for writing the language model into a binary file
+            mine_corrections(list, float, float) -> dict: function for collecting the confident corrections of rare words
+            update(list, float) -> None: function for adding new texts into the language model
+        """
         self.corpus_path = corpus_path
         self.lexicon_path = lexicon_path
         self.ngram = ngram
+        self.max_distance = max_distance
+        self.candidate_budget = candidate_budget
+        if isinstance(self.candidate_budget, (list, tuple)) and len(self.candidate_budget) == 0:
+            raise Exception("Invalid candidate budget")
+        self.cache_path = cache_path
+        self.lm_backend = "compact" if model_path is not None else lm_backend
+        self.model_path = model_path
+        self.decoding = decoding
+        self.beam_width = beam_width
+        self.backoff = backoff
+        self.edit_penalty = edit_penalty
+        self.total_count = None
+        self.count_scale = 1.
+        self.candidate_engine = candidate_engine
+        self.delete_index = None
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        self.stream_chunk_size = stream_chunk_size
+        self.known_threshold = known_threshold
+        self.lexicon = set()
+        self.update_stamp = ""
+        self.model_stamp = None
+
+        # number of tokens returned by the known-word path, answered from the table and of candidate searches
+        self.stats = Counter(known=0, table=0, searched=0)
+        self.corrections = load_corrections(corrections_path) if corrections_path is not None else {}
+
+        # candidates examined and start time of the current sentence, None outside a budgeted sentence
+        self.sentence_budget = sentence_budget
+        self.deadline = deadline
+        self.work = None
+        self.cut = False
+        self.degraded = []
+
+        if use_lexicon:
+            with open(self.lexicon_path, encoding="utf8") as file:
+                self.lexicon = set(file.read().split())
+
+        if self.model_path is not None:
+            self.__load_lang_model__()
+        else:
+            self.__build_lang_model__()
+
+        # the delete index is built on the first candidate search, runs without one never pay for it
+        if self.candidate_engine == "trie":
+            self.trie = Trie(self.lang_models[0])
+        elif self.candidate_engine != "symdelete":
+            raise Exception("Invalid candidate engine")
+
+        # the folding index is also built on its first lookup
+        self.ascii_folding = ascii_folding
+        self.ascii_index = None
+
+        # the compact models find the successors of a context in their sorted keys
+        self.successor_index = None
+        if self.lm_backend == "counter":
+            self.successor_index = [None] + [build_successor_index(m) for m in self.lang_models[1:]]
+
+        # results are cached with the keys `word` and `(context, word)`
+        self.cache = LRUCache(cache_size)
 
-        self.__build_lang_model__()
+        if self.cache_path is not None:
+            self.cache.load(self.cache_path, self.__cache_fingerprint__())
 
 
     def __build_lang_model__(self):
+        # counting the corpus chunk by chunk in bounded memory
+        if self.stream_chunk_size is not None:
+            self.lang_models = build_lang_models_external(self.corpus_path, TOKENS, self.ngram, self.lm_backend,
+                                                          self.stream_chunk_size, width=self.sketch_width,
+                                                          depth=self.sketch_depth)
+            return
+
         with open(self.corpus_path, encoding="utf8") as file:
             corpus = file.read()
 
         # removing punctuations
-        corpus = re.findall("\w+|<s>|<\\\s>", corpus)
+        corpus = re.findall(TOKENS, corpus)
+
+        # integer id n-grams in sorted arrays
+        if self.lm_backend == "compact":
+            self.lang_models = build_compact_lang_models(corpus, self.ngram)
+            return
+
+        # approximate higher orders in fixed size sketches
+        elif self.lm_backend == "sketch":
+            self.lang_models = build_sketch_lang_models(corpus, self.ngram, self.sketch_width, self.sketch_depth)
+            return
+
+        elif self.lm_backend != "counter":
+            raise Exception("Invalid language model backend")
 
         # preparing ngrams
         ngrams = []
@@ -40,48 +297,588 @@ class TurkishNormalizer:
         self.lang_models += [Counter(zip(*ngrams[:i])) for i in range(2, self.ngram+1)]
 
 
-    def normalize(self, word):
-        E1 = list(edits1(word))
-        E2 = [e2 for e in E1 for e2 in edits1(e)]
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # a memory-mapped model is mapped again by the receiving process instead of being copied,
+        # only the updates on top of it are sent
+        if self.model_path is not None:
+            state["lang_models"] = [lang_model.delta for lang_model in self.lang_models]
+            state["delete_index"] = self.delete_index.extra if self.delete_index is not None else None
+
+        return state
+
 
-        # searching possible candidates in the language model
-        cands = {var: self.lang_models[0][var] for var in E1 or E2}
-        cands = {c: cands[c] for c in cands if cands[c] > 0}
-        cands = sorted(cands.items(), key=lambda i:i[1], reverse=True)
+    def __setstate__(self, state):
+        self.__dict__.update(state)
 
-        if len(cands) > 0:
-            return cands[0][0] # most likelihood
+        if self.model_path is not None:
+            deltas, extra = self.lang_models, self.delete_index
+            _, self.lang_models, self.delete_index = load_lang_model(self.model_path)
+
+            for lang_model, delta in zip(self.lang_models, deltas):
+                lang_model.delta = delta
+
+            if extra is not None:
+                self.delete_index.extra = extra
+
+
+    def __cache_fingerprint__(self):
+        "Hash of the corpus, the updates and the settings the cached normalizations depend on."
+        # a mapped model is identified by the stamps in its header, the corpus is not hashed again
+        if self.model_stamp is not None:
+            corpus = self.model_stamp
         else:
-            return word
+            corpus = corpus_stamp(self.corpus_path)["sha256"]
 
+        settings = (corpus, self.update_stamp, self.ngram, self.max_distance, self.candidate_budget, self.lm_backend,
+                    self.sketch_width, self.sketch_depth, self.known_threshold, self.ascii_folding,
+                    sorted(self.lexicon), sorted(self.corrections.items()))
 
-    def normalize_from_ngram(self, word, context):
-        E1 = list(edits1(word))
-        E2 = [e2 for e in E1 for e2 in edits1(e)]
+        return hashlib.sha256(repr(settings).encode("utf8")).hexdigest()
+
+
+    def __build_delete_index__(self):
+        self.delete_index = build_delete_index(self.lang_models[0], self.max_distance)
 
-        # generating ngram from the given context
-        E1 = [[*context, e1] for e1 in E1]
-        E2 = [[*context, e2] for e2 in E2]
 
-        # searching possible candidates in the language model
-        n = len(context) - 1
-        cands = {tuple(var): self.lang_models[n].get(tuple(var)) for var in E1 or E2}
-        cands = {c: cands[c] for c in cands if cands[c] is not None}
-        cands = sorted(cands.items(), key=lambda i: i[1], reverse=True)
+    def __load_lang_model__(self):
+        header = read_header(self.model_path)
 
-        if len(cands) > 0:
-            return cands[0][0][-1] # most likelihood
+        # rebuilding the model file when it is missing, stale or built with smaller settings
+        if is_stale(header, self.corpus_path) or header["ngram"] < self.ngram or header["max_distance"] < self.max_distance:
+            self.__build_lang_model__()
+            self.save_model(self.model_path)
+
+        header, self.lang_models, self.delete_index = load_lang_model(self.model_path)
+
+        # the texts added into the model before it is saved are part of it
+        self.model_stamp = header["corpus"]["sha256"]
+        self.update_stamp = header.get("updates", "")
+
+
+    def save_model(self, path):
+        "Writes the language model and the delete index into a binary file that is memory-mapped at startup."
+        if self.lm_backend == "sketch":
+            raise Exception("Invalid language model backend for saving")
+
+        delete_index = self.delete_index
+        if not isinstance(delete_index, dict):
+            delete_index = build_delete_index(self.lang_models[0], self.max_distance)
+
+        # the counts weighted up since the last decay are written back to their scale
+        save_lang_model(path, compact_lang_models(self.lang_models, 1 / self.count_scale), delete_index,
+                        corpus_stamp(self.corpus_path), self.max_distance, self.update_stamp)
+
+
+    def update(self, texts, decay=None):
+        """
+            Adds the n-grams of new texts into the language model without rebuilding it
+
+            texts(list): new texts, tokenized like the corpus
+            decay(float): factor for fading the counts collected so far, None keeps them as they are
+        """
+        # decaying is done lazily by weighting the new counts up instead of the old ones down
+        if decay is not None:
+            self.count_scale /= decay
+
+        weight = self.count_scale
+        for text in texts:
+            tokens = re.findall(TOKENS, text)
+
+            # the cached results of the updated model are told apart from the ones of the corpus alone
+            self.update_stamp = hashlib.sha256(repr((self.update_stamp, decay, text)).encode("utf8")).hexdigest()
+            new_words = {token for token in tokens if self.lang_models[0].get(token) is None}
+
+            for n, lang_model in enumerate(self.lang_models):
+                ngrams = Counter(tokens) if n == 0 else Counter(zip(*[tokens[i:] for i in range(n + 1)]))
+
+                if self.successor_index is not None and n > 0:
+                    build_successor_index([ngram for ngram in ngrams if ngram not in lang_model],
+                                          self.successor_index[n])
+
+                lang_model.update({ngram: count * weight for ngram, count in ngrams.items()} if weight != 1 else ngrams)
+
+            # making the new words reachable by the candidate search
+            if self.ascii_index is not None:
+                build_ascii_index(new_words, self.ascii_index)
+
+            if self.candidate_engine == "trie":
+                for word in new_words:
+                    self.trie.add(word)
+            elif self.delete_index is not None:
+                build_delete_index(new_words, self.max_distance, self.delete_index)
+
+        # counts are brought back to their scale before the weights grow too large
+        if self.count_scale > 1e12:
+            self.__rescale_counts__()
+
+        self.total_count = None
+        self.cache.clear()
+
+
+    def update_from_file(self, path, decay=None):
+        with open(path, encoding="utf8") as file:
+            self.update([file.read()], decay)
+
+
+    def __rescale_counts__(self):
+        if self.lm_backend == "compact":
+            self.lang_models = merge_lang_models(self.lang_models, 1 / self.count_scale)
         else:
+            for lang_model in self.lang_models:
+                if isinstance(lang_model, Counter):
+                    for ngram in lang_model:
+                        lang_model[ngram] /= self.count_scale
+                else:
+                    lang_model.scale(1 / self.count_scale)
+
+        self.count_scale = 1.
+
+
+    def __tier_budget__(self, tier):
+        # the deeper tiers than the given budgets reuse the last one
+        if isinstance(self.candidate_budget, (list, tuple)):
+            return self.candidate_budget[min(tier, len(self.candidate_budget)) - 1]
+
+        return self.candidate_budget
+
+
+    def __tier_limit__(self):
+        "Highest tier the candidate search can still reach within the budget of the current sentence."
+        if self.work is None:
+            return self.max_distance
+
+        spent, started = self.work
+        over = spent / self.sentence_budget if self.sentence_budget is not None else 0.
+
+        if self.deadline is not None:
+            over = max(over, (time.perf_counter() - started) / self.deadline)
+
+        # falling back to distance 1 once the budget is spent, and to the word itself at twice the budget
+        if over < 1:
+            return self.max_distance
+
+        return min(1, self.max_distance) if over < 2 else 0
+
+
+    def __within_limit__(self, tier):
+        if tier <= self.__tier_limit__():
+            return True
+
+        self.cut = True
+        return False
+
+
+    def candidates(self, word):
+        """
+            Lazily yields the vocabulary words around `word` tier by tier: the word itself together with
+            the words at distance 1 first, then the words at distance 2 and so on up to `max_distance`.
+            Each tier is cut as soon as its candidate budget is spent.
+        """
+        if self.candidate_engine == "trie":
+            return self.__trie_candidates__(word)
+
+        return self.__delete_candidates__(word)
+
+
+    def __trie_candidates__(self, word):
+        # every tier walks the trie with its own bound, farther tiers are paid only when they are reached
+        for tier in range(1, self.max_distance + 1):
+            if not self.__within_limit__(tier):
+                return
+
+            found = self.trie.search(word, tier, LETTERS, self.__tier_budget__(tier))
+            if self.work is not None:
+                self.work[0] += len(found)
+
+            # the word itself is ranked together with the words at distance 1
+            yield [c for c, distance in found if distance == tier or tier == 1]
+
+
+    def __delete_candidates__(self, word):
+        if self.delete_index is None:
+            self.__build_delete_index__()
+
+        seen, tiers = set(), {d: [] for d in range(self.max_distance + 1)}
+        examined = 0
+
+        for tier in range(self.max_distance + 1):
+            if not self.__within_limit__(max(tier, 1)):
+                return
+
+            # the variants are generated one by one, a long token is cut by the budget before they pile up
+            variants = ("".join(word[i+1:j] for i, j in zip((-1,) + deleted, deleted + (len(word),)))
+                        for deleted in itertools.combinations(range(len(word)), tier))
+
+            # the word itself is yielded with the distance 1 tier and shares its budget
+            budget = self.__tier_budget__(max(tier, 1))
+            if tier > 1:
+                examined = 0
+
+            # a vocabulary word within the distance shares at least one delete variant with the word
+            for variant in variants:
+                # the tier is cut short when the sentence runs out of its budget, probing a variant
+                # is charged as a fraction of examining a candidate
+                if self.work is not None:
+                    self.work[0] += VARIANT_COST
+
+                    if not self.__within_limit__(max(tier, 1)):
+                        break
+
+                for cand in self.delete_index.get(variant, ()):
+                    if budget is not None and examined >= budget:
+                        break
+
+                    if cand in seen:
+                        continue
+
+                    seen.add(cand)
+                    examined += 1
+                    distance = edit_distance(word, cand, self.max_distance)
+
+                    if distance <= self.max_distance:
+                        tiers[distance].append(cand)
+
+                    if self.work is not None:
+                        self.work[0] += 1
+
+                if budget is not None and examined >= budget:
+                    break
+
+            # the word itself is ranked together with the words at distance 1
+            if tier == 1:
+                yield tiers[0] + tiers[1]
+            elif tier > 1:
+                yield tiers[tier]
+
+
+    def __folded_candidates__(self, word):
+        "Spellings of a word typed without its diacritics, none for a word with diacritics or in the vocabulary."
+        if not self.ascii_folding or word != fold_ascii(word) or self.lang_models[0].get(word):
+            return []
+
+        if self.ascii_index is None:
+            self.ascii_index = build_ascii_index(self.lang_models[0])
+
+        return self.ascii_index.get(word, [])
+
+
+    def __best_folded__(self, word, score):
+        "Best spelling of the word with its diacritics restored, None when no spelling is scored."
+        folded = self.__folded_candidates__(word)
+        if len(folded) == 0:
+            return None
+
+        scores = {c: score(c) for c in folded}
+        scores = {c: s for c, s in scores.items() if s}
+
+        return max(scores, key=scores.get) if len(scores) > 0 else None
+
+
+    def __best_candidate__(self, word, score):
+        # going down the tiers until one of the candidates is scored by the language model
+        for cands in self.candidates(word):
+            scores = {c: score(c) for c in cands}
+            scores = {c: s for c, s in scores.items() if s}
+
+            if len(scores) > 0:
+                return max(scores, key=scores.get) # most likelihood
+
+        return word
+
+
+    def __is_known__(self, word):
+        "Whether the word is taken as correct without searching its candidates, counted in the stats."
+        known = word in self.lexicon
+
+        # counts are stored weighted up by the count scale since the last decay
+        if not known and self.known_threshold is not None:
+            count = self.lang_models[0].get(word)
+            known = count is not None and count / self.count_scale >= self.known_threshold
+
+        if known:
+            self.stats["known"] += 1
+
+        return known
+
+
+    def __table_correction__(self, word):
+        correction = self.corrections.get(word)
+
+        if correction is not None:
+            self.stats["table"] += 1
+
+        return correction
+
+
+    def mine_corrections(self, texts, rare_count=2, min_ratio=50.):
+        """
+            Normalizes every distinct rare word of the texts once and keeps the confident decisions for the
+            correction table. The table is written by save_corrections and loaded with corrections_path.
+
+            texts(list): texts to be mined
+            rare_count(float): unigram count under which a word is mined
+            min_ratio(float): minimum ratio of the count of the correction to the count of the word plus one
+
+            Returns a dict of the corrections.
+        """
+        words = {word for text in texts for word in re.findall("\w+", text)}
+        corrections = {}
+
+        for word in words:
+            # counts are stored weighted up by the count scale since the last decay
+            count = (self.lang_models[0].get(word) or 0) / self.count_scale
+            if count >= rare_count:
+                continue
+
+            correction = self.normalize(word)
+            if correction == word:
+                continue
+
+            if (self.lang_models[0].get(correction) or 0) / self.count_scale >= min_ratio * (count + 1):
+                corrections[word] = correction
+
+        return corrections
+
+
+    def normalize(self, word):
+        if self.__is_known__(word):
             return word
 
+        correction = self.__table_correction__(word)
+        if correction is not None:
+            return correction
 
-    def normalize_sentence(self, sentence):
-        sentence  = re.findall("\w+", sentence)
+        norm = self.cache.get(word)
+
+        if norm is None:
+            self.stats["searched"] += 1
+            self.cut = False
+
+            # a single lookup for the diacritics typed as ASCII before the edit search
+            norm = self.__best_folded__(word, self.lang_models[0].get)
+            if norm is None:
+                norm = self.__best_candidate__(word, self.lang_models[0].get)
+
+            self.__store__(word, word, norm)
+
+        return norm
+
+
+    def normalize_from_ngram(self, word, context):
+        if self.__is_known__(word):
+            return word
+
+        correction = self.__table_correction__(word)
+        if correction is not None:
+            return correction
+
+        context = tuple(context)
+        norm = self.cache.get((context, word))
+
+        if norm is None:
+            self.stats["searched"] += 1
+            self.cut = False
+
+            # an n-gram with a context of n-1 words is stored in the n-th language model
+            lang_model = self.lang_models[len(context)]
+            norm = self.__best_folded__(word, lambda c: lang_model.get((*context, c)))
+
+            if norm is None:
+                successors = self.__successors__(context)
+
+                if successors is None:
+                    norm = self.__best_candidate__(word, lambda c: lang_model.get((*context, c)))
+                else:
+                    norm = self.__best_successor__(word, successors)
+
+            self.__store__((context, word), word, norm)
+
+        return norm
+
+
+    def __store__(self, key, word, norm):
+        # results of a search cut by the budget are not cached, their position is reported as degraded instead
+        if not self.cut:
+            self.cache.put(key, norm)
+
+
+    def __successors__(self, context):
+        # budgeted tiers are only reproduced by probing the candidates
+        if self.candidate_budget is not None:
+            return None
+
+        lang_model = self.lang_models[len(context)]
+        if hasattr(lang_model, "successors"):
+            return lang_model.successors(context)
+
+        if self.successor_index is None:
+            return None
+
+        return [(c, lang_model[(*context, c)]) for c in self.successor_index[len(context)].get(context, ())]
+
+
+    def __best_successor__(self, word, successors):
+        """
+            Same choice as probing the candidates of the word in the context, found among the few words
+            observed after the context instead: the most frequent one in the lowest tier within the distance.
+        """
+        best, best_rank = word, None
+        limit = self.max_distance
+
+        for i, (cand, count) in enumerate(successors):
+            # the successors are scanned within the distance still allowed by the budget, checked every 64 of them
+            if self.work is not None and i % 64 == 0:
+                self.work[0] += min(64, len(successors) - i)
+                limit = self.__tier_limit__()
+
+                if limit < self.max_distance:
+                    self.cut = True
+                if limit == 0:
+                    break
+
+            if not count:
+                continue
+
+            distance = edit_distance(word, cand, limit)
+            if max(distance, 1) > limit:
+                continue
+
+            # the word itself is ranked together with the words at distance 1 and kept on a tie
+            rank = (max(distance, 1), -count, distance)
+
+            if best_rank is None or rank < best_rank:
+                best, best_rank = cand, rank
+
+        return best
+
+
+    def save_cache(self):
+        if self.cache_path is not None:
+            self.cache.save(self.cache_path, self.__cache_fingerprint__())
+
+
+    def __lattice_candidates__(self, word):
+        if self.__is_known__(word):
+            return [(word, 0)]
+
+        correction = self.__table_correction__(word)
+        if correction is not None:
+            return [(correction, 1)]
+
+        self.stats["searched"] += 1
+        self.cut = False
+
+        # spellings with the diacritics restored count as a single edit whatever their number
+        folded = [(c, 1) for c in self.__folded_candidates__(word) if self.lang_models[0].get(c)]
+        if len(folded) > 0:
+            return folded
+
+        # candidates of the first non-empty tier with their number of edits
+        lattice = [(word, 0)]
+
+        for distance, cands in enumerate(self.candidates(word), 1):
+            if len(cands) > 0:
+                lattice = [(c, 0 if c == word else distance) for c in cands]
+                break
+
+        return lattice
+
+
+    def __backoff_scores__(self, contexts, cands):
+        "Stupid backoff log scores of every candidate after every context, looked up in batches per order."
+        total  = self.__total_count__()
+        scores = [[None] * len(cands) for _ in contexts]
+
+        for n in range(self.ngram - 1, 0, -1):
+            pending = [(i, j) for i, context in enumerate(contexts) if len(context) >= n
+                              for j in range(len(cands)) if scores[i][j] is None]
+            if len(pending) == 0:
+                continue
+
+            ngrams = [(*contexts[i][-n:], cands[j]) for i, j in pending]
+            prefix = [ngram[:-1] if n > 1 else ngram[0] for ngram in ngrams]
+
+            counts = lookup_many(self.lang_models[n], ngrams)
+            prefix_counts = lookup_many(self.lang_models[n-1], prefix)
+
+            for (i, j), count, prefix_count in zip(pending, counts, prefix_counts):
+                if count and prefix_count:
+                    skipped = min(self.ngram - 1, len(contexts[i])) - n
+                    scores[i][j] = math.log(count / prefix_count) + skipped * math.log(self.backoff)
+
+        # backing off to the unigrams, unknown words get a fraction of a single occurrence
+        counts = lookup_many(self.lang_models[0], cands)
+
+        for i, context in enumerate(contexts):
+            skipped = min(self.ngram - 1, len(context))
+
+            for j, count in enumerate(counts):
+                if scores[i][j] is None:
+                    scores[i][j] = math.log((count or self.backoff) / total) + skipped * math.log(self.backoff)
+
+        return scores
+
+
+    def __total_count__(self):
+        if self.total_count is None:
+            self.total_count = sum(count for _, count in self.lang_models[0].items())
+
+        return self.total_count
+
+
+    def __decode_beam__(self, sentence, candidates=None):
+        # generating the candidates of every position once, unless they are already resolved for a batch
+        if candidates is None:
+            candidates, cut = {}, set()
+
+            # in the order of the sentence, the budget falls back on the last tokens whatever the hash seed
+            for word in dict.fromkeys(sentence):
+                self.cut = False
+                candidates[word] = self.__lattice_candidates__(word)
+
+                if self.cut:
+                    cut.add(word)
+
+            # every occurrence of a word is decoded from the same cut candidates
+            self.degraded = [i for i, word in enumerate(sentence) if word in cut]
+
+        lattice = [candidates[word] for word in sentence]
+
+        # hypotheses sharing the last n-1 words are recombined, only the best of them survives
+        beam = {(): (0., [])}
+
+        for cands in lattice:
+            hypotheses = list(beam.items())
+            scores = self.__backoff_scores__([context for context, _ in hypotheses], [c for c, _ in cands])
+
+            expansions = {}
+            for (context, (score, words)), row in zip(hypotheses, scores):
+                for (cand, distance), cand_score in zip(cands, row):
+                    total = score + cand_score + distance * math.log(self.edit_penalty)
+                    state = (*context, cand)[-(self.ngram - 1):] if self.ngram > 1 else ()
+
+                    if state not in expansions or total > expansions[state][0]:
+                        expansions[state] = (total, words + [cand])
+
+            beam = dict(sorted(expansions.items(), key=lambda i: i[1][0], reverse=True)[:self.beam_width])
+
+        return max(beam.values(), key=lambda i: i[0])[1]
+
+
+    def __decode_greedy__(self, sentence, resolved=None):
         norm_sent = []
 
         for i, word in enumerate(sentence):
+            self.cut = False
+
             if i < self.ngram:
-                norm_sent.append(self.normalize(word))
+                norm_sent.append(resolved[word] if resolved is not None else self.normalize(word))
+            elif self.__is_known__(word):
+                norm_sent.append(word)
+            elif word in self.corrections:
+                norm_sent.append(self.__table_correction__(word))
             else:
                 for n in range(self.ngram-1, 0, -1):
                     candidate = self.normalize_from_ngram(sentence[i], norm_sent[i-n:i])
@@ -92,4 +889,100 @@ class TurkishNormalizer:
 
                 norm_sent.append(candidate)
 
-        return " ".join(norm_sent)
+            if self.cut:
+                self.degraded.append(i)
+
+        return norm_sent
+
+
+    def normalize_sentence(self, sentence):
+        return self.normalize_sentence_report(sentence)[0]
+
+
+    def normalize_sentence_report(self, sentence):
+        """
+            Normalizes the sentence like normalize_sentence within the sentence budget and deadline.
+            Returns the normalized sentence with the positions of the tokens whose search was cut short.
+        """
+        sentence = re.findall("\w+", sentence)
+        self.degraded = []
+
+        if self.sentence_budget is not None or self.deadline is not None:
+            self.work = [0, time.perf_counter()]
+
+        try:
+            if self.decoding == "beam":
+                norm_sent = self.__decode_beam__(sentence)
+            else:
+                norm_sent = self.__decode_greedy__(sentence)
+        finally:
+            self.work = None
+
+        return " ".join(norm_sent), self.degraded
+
+
+    def normalize_batch(self, sentences):
+        "Normalizes a batch of sentences like normalize_sentence, resolving every distinct token once."
+        # the budget is spent sentence by sentence
+        if self.sentence_budget is not None or self.deadline is not None:
+            return [self.normalize_sentence(sentence) for sentence in sentences]
+
+        sentences = [re.findall("\w+", sentence) for sentence in sentences]
+
+        if self.decoding == "beam":
+            words = {word for sentence in sentences for word in sentence}
+            candidates = {word: self.__lattice_candidates__(word) for word in words}
+
+            return [" ".join(self.__decode_beam__(sentence, candidates)) for sentence in sentences]
+
+        # only the first words of a sentence are normalized without a context
+        words = {word for sentence in sentences for word in sentence[:self.ngram]}
+        resolved = {word: self.normalize(word) for word in words}
+
+        return [" ".join(self.__decode_greedy__(sentence, resolved)) for sentence in sentences]
+
+
+    def normalize_parallel(self, sentences, workers=None, chunk_size=None):
+        """
+            Normalizes the sentences like normalize_batch over a pool of processes, keeping their order.
+            The language model is built once in this process and shared with the workers, forked workers
+            inherit it copy-on-write and the others receive it once at startup or map the same model file.
+            The results cached by the workers are merged into the cache of this process.
+        """
+        global _worker_normalizer
+
+        workers = workers or os.cpu_count()
+        if workers <= 1 or len(sentences) <= 1:
+            return self.normalize_batch(sentences)
+
+        # a few chunks per worker to balance the load
+        chunk_size = chunk_size or -(-len(sentences) // (workers * 4))
+        chunks = [sentences[i:i + chunk_size] for i in range(0, len(sentences), chunk_size)]
+
+        # building the indexes once here instead of in every worker
+        if self.candidate_engine == "symdelete" and self.delete_index is None:
+            self.__build_delete_index__()
+
+        if self.ascii_folding and self.ascii_index is None:
+            self.ascii_index = build_ascii_index(self.lang_models[0])
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            _worker_normalizer = self
+            context, initializer, initargs = multiprocessing.get_context("fork"), None, ()
+        else:
+            context, initializer, initargs = multiprocessing.get_context(), _init_worker, (self,)
+
+        try:
+            with context.Pool(workers, initializer, initargs) as pool:
+                results = pool.map(_normalize_chunk, chunks)
+        finally:
+            _worker_normalizer = None
+
+        # merging the cache entries and stats of the workers, so they are kept and persisted like serial ones
+        for _, journal, stats in results:
+            for key, value in journal.items():
+                self.cache.put(key, value)
+
+            self.stats.update(stats)
+
+        return [sentence for chunk, _, _ in results for sentence in chunk]
@@ -1,85 +1,133 @@
-import json
-import re
+import hashlib
+import os
+import pickle
+from cache import LRUCache
+from morphology import MorphologyFST, read_rules
+
+ARTIFACT_VERSION = 2
+
+
+def sources_hash(paths, settings):
+    "Content hash of the source files and of the settings an artifact is compiled with."
+    digest = hashlib.sha256(repr(settings).encode("utf8"))
+
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+
+    return digest.hexdigest()
+
 
 class TurkishStemmer:
-    def __init__(self, lexicon_path, grammar_path, use_derivational=True):
+    def __init__(self, lexicon_path, grammar_path, use_derivational=True, prefix_pruning=False, cache_size=100000,
+                 artifact_path=None):
         """
             Main Class for appyling Turkish Stemmer
             
             lexicon_path(str): path for the lexicon file
             grammar_path(str): path for the grammar file
             use_derivational(bool): including derivational suffixes in the stemming or not
+            prefix_pruning(bool): stripping only the suffixes that leave a lexicon word as a prefix of the token,
+                                  the token is returned as it is when none of its prefixes is in the lexicon
+            cache_size(int): maximum number of stems kept in memory, 0 disables caching
+            artifact_path(str): path for the compiled suffixes and lexicon, loaded when it is built from the same
+                                files and settings and compiled again otherwise
             
             ---
             stem(str) -> str: function for stemming single token
+            stem_analysis(str) -> (str, list): function for stemming single token with its stripped suffixes
             stem_sentence(str) -> str: function for stemming all tokens in the given sentence
+            stem_batch(list) -> list: function for stemming a batch of sentences or token lists
+            save_artifact(str) -> None: function for writing the compiled suffixes and lexicon into a file
         """
         self.lexicon_path = lexicon_path
         self.grammar_path = grammar_path
         self.use_derivational = use_derivational
+        self.prefix_pruning = prefix_pruning
+        self.artifact_path = artifact_path
         
-        self.grammar = self.__read_grammar__()
-            
-        with open(self.lexicon_path, encoding="utf8") as file:
-            self.lexicon = file.read().split()
+        if self.artifact_path is None or not self.__load_artifact__():
+            self.fst = self.__compile__()
+
+            if self.artifact_path is not None:
+                self.save_artifact(self.artifact_path)
+
+        self.lexicon = self.fst.lexicon
+
+        # stems are cached with the key `token`
+        self.cache = LRUCache(cache_size)
     
     
-    def __read_grammar__(self):
-        def __applyRulesRegex__(self, rules):
-            rules = [re.sub("\(y\)", "y*", r) for r in rules] 
-            rules = [re.sub("-", "", r) for r in rules]
+    def __sources_hash__(self):
+        return sources_hash([self.lexicon_path, self.grammar_path], (self.use_derivational, self.prefix_pruning))
 
-            return rules
 
-        with open(self.grammar_path, encoding="utf8") as file:
-            grammar = json.load(file)
-        
-        # reading suffixes
-        _suffixes = []
-        for rule in grammar:
-            
-            # deciding to include derivational suffixes
-            if rule is "Derivational": 
-                if self.use_derivational:
-                    _suffixes += grammar[rule]
-            else:
-                _suffixes += grammar[rule]
-            
-        
-        # removing dash sign
-        _suffixes = [s.replace("-", "") for s in _suffixes]
-        
-        # sorting suffixes with respect to their length
-        self.max_suffix_len = max([len(s) for s in _suffixes])
+    def __load_artifact__(self):
+        if not os.path.exists(self.artifact_path):
+            return False
 
-        suffixes = {l: [] for l in range(1, self.max_suffix_len + 1)}
-        
-        for suffix in _suffixes:
-            suffixes[len(suffix)].append(suffix) 
-            
-        # preparing suffix regexes
-        for sfx in suffixes:
-            suffixes[sfx] = f"\w*({'|'.join(suffixes[sfx])})"
-        
-        return suffixes
+        with open(self.artifact_path, "rb") as file:
+            artifact = pickle.load(file)
+
+        # a stale artifact is compiled again
+        if artifact["version"] != ARTIFACT_VERSION or artifact["hash"] != self.__sources_hash__():
+            return False
+
+        self.__dict__.update(artifact["state"])
+        return True
+
+
+    def save_artifact(self, path):
+        artifact = {"version": ARTIFACT_VERSION, "hash": self.__sources_hash__(), "state": {"fst": self.fst}}
+
+        # written next to the target first, so a reader never sees a partial file
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(artifact, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + ".tmp", path)
+
+
+    def __compile__(self):
+        with open(self.lexicon_path, encoding="utf8") as file:
+            lexicon = set(file.read().split())
+
+        # the prefixes of a token that are lexicon words are found in a single walk when pruning
+        return MorphologyFST(read_rules(self.grammar_path, self.use_derivational), lexicon, self.prefix_pruning)
         
     
     def stem(self, token: str) -> str:
-        # token is found in the lexicon
-        if token in self.lexicon:
-            return token 
+        stem = self.cache.get(token)
 
-        for suffix_len in range(self.max_suffix_len, 1, -1):
-            
-            # matching suffix rule is found
-            if re.match(self.grammar[suffix_len], token):
-                return self.stem(token[:-suffix_len]) 
+        if stem is None:
+            stem = self.stem_analysis(token)[0]
+            self.cache.put(token, stem)
 
-        return token        
+        return stem
+
+
+    def stem_analysis(self, token: str) -> (str, list):
+        """
+            Stems the token like stem, stripping the longest matching suffix of at least two letters until the
+            token is found in the lexicon. Returns the stem with the stripped (suffix, categories) pairs, the
+            last suffix of the token first.
+        """
+        return self.fst.analyze(token, with_suffixes=True, min_suffix_len=2, prune=self.prefix_pruning)
     
     
     def stem_sentence(self, sentence:str) -> str:
         sentence  = sentence.split(" ")
         stem_sent = [self.stem(word) for word in sentence]
         
-        return " ".join(stem_sent)
\ No newline at end of file
+        return " ".join(stem_sent)
+
+
+    def stem_batch(self, sentences: list) -> list:
+        """
+            Stems a batch of sentences like stem_sentence, stemming every distinct token once. Sentences given as
+            lists of tokens are not split again and their stems are returned as lists.
+        """
+        tokenized = [sent.split(" ") if isinstance(sent, str) else sent for sent in sentences]
+        stems = {token: self.stem(token) for token in {token for sent in tokenized for token in sent}}
+
+        return [" ".join(stems[token] for token in tokens) if isinstance(sent, str) else [stems[token] for token in tokens]
+                for sent, tokens in zip(sentences, tokenized)]
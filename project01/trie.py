@@ -0,0 +1,127 @@
+class Trie:
+    def __init__(self, words=()):
+        """
+            Character trie over a set of words
+
+            words(iterable): initial words of the trie
+
+            ---
+            add(str) -> None: function for inserting a word
+            has_prefix(str) -> bool: function for checking whether any word starts with the given prefix
+            prefix_ends(str) -> list: function for finding the lengths of the prefixes of a token that are words
+            search(str, int) -> list: function for finding the words within the given edit distance of a token
+        """
+        self.root = {}
+        self.size = 0
+
+        for word in words:
+            self.add(word)
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __contains__(self, word):
+        node = self.__find__(word)
+        return node is not None and None in node
+
+
+    def __find__(self, prefix):
+        node = self.root
+
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+
+        return node
+
+
+    def add(self, word):
+        node = self.root
+
+        for char in word:
+            node = node.setdefault(char, {})
+
+        # the word itself is kept at the end of its path
+        if None not in node:
+            node[None] = word
+            self.size += 1
+
+
+    def has_prefix(self, prefix):
+        return self.__find__(prefix) is not None
+
+
+    def prefix_ends(self, token):
+        "Lengths of the prefixes of the token that are words, found in a single walk."
+        node, ends = self.root, []
+
+        for i, char in enumerate(token):
+            if None in node:
+                ends.append(i)
+
+            node = node.get(char)
+            if node is None:
+                return ends
+
+        if None in node:
+            ends.append(len(token))
+
+        return ends
+
+
+    def search(self, token, max_distance, letters=None, budget=None):
+        """
+            Words whose optimal string alignment distance to `token` is at most `max_distance`, computed
+            row by row while walking the trie. Branches whose row is already over the distance are pruned.
+
+            token(str): searched token
+            max_distance(int): maximum edit distance
+            letters(str): letters that can be inserted or replaced into the token, None for any letter
+            budget(int): maximum number of words found before the walk stops, None for no limit
+
+            Returns a list of (word, distance) pairs.
+        """
+        inf   = max_distance + 1
+        size  = len(token)
+        first = [min(i, inf) for i in range(size + 1)]
+        found = []
+
+        # a stack of nodes with their depth and last two rows, the distances of the token prefixes to the node prefix
+        stack = [(child, 1, char, None, first, None) for char, child in self.root.items() if char is not None]
+
+        while stack:
+            node, depth, char, prev_char, prev, before = stack.pop()
+            insertable = letters is None or char in letters
+
+            # only the token prefixes within the distance of the depth can be reached
+            row = [inf] * (size + 1)
+            row[0] = prev[0] + 1 if insertable and prev[0] < inf else inf
+
+            for i in range(max(1, depth - max_distance), min(size, depth + max_distance) + 1):
+                if token[i-1] == char:
+                    dist = min(prev[i-1], row[i-1] + 1, prev[i] + 1 if insertable else inf)
+                elif insertable:
+                    dist = min(prev[i-1], prev[i], row[i-1]) + 1    # replacement, insertion, deletion
+                else:
+                    dist = row[i-1] + 1                             # deletion
+
+                # transposition
+                if before is not None and i > 1 and token[i-1] == prev_char and token[i-2] == char:
+                    dist = min(dist, before[i-2] + 1)
+
+                row[i] = min(dist, inf)
+
+            if None in node and row[-1] <= max_distance:
+                found.append((node[None], row[-1]))
+
+                if budget is not None and len(found) >= budget:
+                    break
+
+            # pruning the branch when every token prefix is already over the distance
+            if min(row) <= max_distance:
+                stack.extend((child, depth + 1, c, char, row, prev) for c, child in node.items() if c is not None)
+
+        return found
@@ -66,6 +66,9 @@ class TurkishContextFreeGrammar:
                                  "Ablative|Dativ|Locative|Accusative": "case"
                                  }
 
+        if self.morphological_analyzer_strategy == "stemmer":
+            self.buildSuffixFeatureCodes()
+
 
     def prepareSuffixCategories(self, suffixCats):
         categories = {}
@@ -78,6 +81,49 @@ class TurkishContextFreeGrammar:
         return categories
 
 
+    def buildSuffixFeatureCodes(self):
+        # every rule is a bit field of the feature code, holding the index of the matched value plus one
+        self.featureFields = []
+        shift = 0
+
+        for rule in self.suffixCategoryRules:
+            values = self.suffixCategoryRules[rule].split("|")
+            self.featureFields.append((rule, shift, values))
+            shift += len(values).bit_length()
+
+        # code and mask of the fields set by every category id of the stemmer
+        self.suffixFeatureCodes = []
+        self.suffixFeatureMasks = []
+
+        for category in self.stemmer.categories:
+            code, mask = 0, 0
+
+            for rule, shift, values in self.featureFields:
+                fieldMask = ((1 << len(values).bit_length()) - 1) << shift
+                categorySearch = re.search(self.suffixCategoryRules[rule], category)
+
+                if categorySearch:
+                    code |= (values.index(categorySearch.group()) + 1) << shift
+                    mask |= fieldMask
+
+            self.suffixFeatureCodes.append(code)
+            self.suffixFeatureMasks.append(mask)
+
+
+    def prepareSuffixCategoryIds(self, suffixIds):
+        # same as prepareSuffixCategories, the fields of the later suffixes override the earlier ones
+        code = 0
+        for i in suffixIds:
+            code = (code & ~self.suffixFeatureMasks[i]) | self.suffixFeatureCodes[i]
+
+        categories = {}
+        for rule, shift, values in self.featureFields:
+            value = (code >> shift) & ((1 << len(values).bit_length()) - 1)
+            if value:
+                categories[rule] = values[value - 1]
+        return categories
+
+
     def mapCategoryLabels(self, category):
         categoryLabels = {}
 
@@ -343,12 +389,12 @@ class TurkishContextFreeGrammar:
 
 
 
-    def extract_pos_categories_stemmer(self, token):
+    def extract_pos_categories_stemmer(self, token, analysis=None):
         categories = self.search_terminal(token, [])
 
         if len(categories) == 0:
-            stem, suffixes = self.stemmer.stem(token)
-            suffixes = self.prepareSuffixCategories(suffixes)
+            stem, suffixIds = analysis if analysis is not None else self.stemmer.analyze_batch([token])[0]
+            suffixes = self.prepareSuffixCategoryIds(suffixIds)
             categories = self.search_terminal(stem, suffixes)
 
 
@@ -374,7 +420,11 @@ class TurkishContextFreeGrammar:
         vars = []
         pos_tags = []
 
-        for token in words:
+        # repeated tokens of the sentence are stemmed once
+        if self.morphological_analyzer_strategy == "stemmer":
+            analyses = self.stemmer.analyze_batch([token.lower() for token in words])
+
+        for idx, token in enumerate(words):
             if self.morphological_analyzer_strategy == "zeyrek":
                 pos, subcats = self.extract_pos_categories_zeyrek(token)
 
@@ -387,7 +437,7 @@ class TurkishContextFreeGrammar:
                 pos_tags.append(_p)
 
             elif self.morphological_analyzer_strategy == "stemmer":
-                pos, subcats = self.extract_pos_categories_stemmer(token.lower())
+                pos, subcats = self.extract_pos_categories_stemmer(token.lower(), analyses[idx])
 
                 vars.append([Variable(pos, True, None, None, subcats, token)])
                 pos_tags.append(pos)
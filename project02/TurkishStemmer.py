@@ -1,9 +1,29 @@
 import re
+import os
 import json
+import pickle
+import hashlib
+import itertools
 from collections import Counter
 
+ARTIFACT_VERSION = 8
+LETTERS = 'abcçdefgğhijklmnoöpqrsştuüvwxyz'
+
+
+def sources_hash(paths: list[str], settings) -> str:
+    "Content hash of the source files and of the settings an artifact is compiled with."
+    digest = hashlib.sha256(repr(settings).encode("utf8"))
+
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+
+    return digest.hexdigest()
+
+
 class TurkishStemmer:
-    def __init__(self, lexicon_path, suffixes_path, corpus_path, include_categories=False, use_derivational=True):
+    def __init__(self, lexicon_path, suffixes_path, corpus_path, include_categories=False, use_derivational=True,
+                 artifact_path=None):
         """
             Main Class for appyling Turkish Stemmer
 
@@ -11,18 +31,30 @@ class TurkishStemmer:
             suffixes_path(str): path for the suffixes file
             corpus_path(str): path for the corpus file
             use_derivational(bool): including derivational suffixes in the stemming or not
+            artifact_path(str): path for the compiled suffixes, lexicon and corpus counts, loaded when it is built
+                                from the same files and settings and compiled again otherwise
 
             ---
             stem(str) -> str: function for stemming single token
             stem_sentence(str) -> str: function for stemming all tokens in the given sentence
+            analyze(str, int) -> list: function for finding every analysis of a token as (root, categories), up to a limit
+            iter_analyses(str) -> iterator: function for enumerating the analyses of a token lazily
+            analyze_batch(list) -> list: function for stemming the tokens into (root, category ids), once per unique token
+            category_names(bytes) -> list: function for decoding category ids into the category names
+            save_artifact(str) -> None: function for writing the compiled suffixes, lexicon and corpus counts
         """
         self.lexicon_path = lexicon_path
         self.suffixes_path = suffixes_path
         self.corpus_path = corpus_path
         self.include_categories = include_categories
         self.use_derivational = use_derivational
+        self.artifact_path = artifact_path
+
+        if self.artifact_path is not None and self.__load_artifact__():
+            return
 
         self.suffixes = self.__read_suffixes__()
+        self.suffix_trie = self.__build_suffix_trie__()
 
         with open(self.lexicon_path, encoding="utf8") as file:
             self.lexicon = file.read().split()
@@ -34,6 +66,53 @@ class TurkishStemmer:
         corpus = re.findall("\w+|<s>|<\\\s>", corpus)
         self.corpus = Counter(corpus)
 
+        self.mask_index = self.__build_mask_index__()
+
+        if self.artifact_path is not None:
+            self.save_artifact(self.artifact_path)
+
+
+    def __sources_hash__(self) -> str:
+        return sources_hash([self.lexicon_path, self.suffixes_path, self.corpus_path], self.use_derivational)
+
+
+    def __load_artifact__(self) -> bool:
+        if not os.path.exists(self.artifact_path):
+            return False
+
+        with open(self.artifact_path, "rb") as file:
+            artifact = pickle.load(file)
+
+        # a stale artifact is compiled again
+        if artifact["version"] != ARTIFACT_VERSION or artifact["hash"] != self.__sources_hash__():
+            return False
+
+        self.__dict__.update(artifact["state"])
+        return True
+
+
+    def save_artifact(self, path: str) -> None:
+        state = {name: getattr(self, name) for name in ("suffixes", "suffix_trie", "max_suffix_len", "categories",
+                                                     "category_ids", "lexicon", "corpus", "mask_index")}
+        artifact = {"version": ARTIFACT_VERSION, "hash": self.__sources_hash__(), "state": state}
+
+        # written next to the target first, so a reader never sees a partial file
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(artifact, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + ".tmp", path)
+
+
+    def __build_mask_index__(self) -> dict:
+        "Maps every lexicon word with one of its letters masked to the word, words one replacement apart share a key."
+        mask_index = {}
+
+        for word in self.lexicon:
+            for i in range(len(word)):
+                mask_index.setdefault(word[:i] + "\0" + word[i+1:], []).append(word)
+
+        return mask_index
+
 
     def __read_suffixes__(self) -> list[(str, str)]:
         def __applyRulesRegex__(self, rules):
@@ -48,6 +127,13 @@ class TurkishStemmer:
         # reading suffixes
         suffixes = []
 
+        # fixed table of the category ids, in the order of the rules file, the normalization adds the last two
+        self.categories = list(dict.fromkeys(list(suffixes_dict) + ["Dativ", "Accusative"]))
+        self.category_ids = {category: i for i, category in enumerate(self.categories)}
+
+        if len(self.categories) > 256:
+            raise Exception("Invalid suffixes file, category ids are kept in single bytes")
+
         # reading max length
         self.max_suffix_len = max([max([len(s.replace("-", "")) for s in suffixes_dict[sfx]]) for sfx in suffixes_dict])
 
@@ -71,6 +157,90 @@ class TurkishStemmer:
         return suffixes
 
 
+    def __build_suffix_trie__(self) -> dict:
+        "Suffixes written backwards into a character trie, each ending with its (rank, length, category) entries."
+        suffix_trie = {}
+
+        # the rank is the order in which stem_to_word tries the suffixes
+        ranked = [suffix for suffixes in self.suffixes for suffix in suffixes]
+
+        for rank, (suffix, category) in enumerate(ranked):
+            node = suffix_trie
+            for char in reversed(suffix):
+                node = node.setdefault(char, {})
+
+            node.setdefault(None, []).append((rank, len(suffix), category))
+
+        return suffix_trie
+
+
+    def __lattice_node__(self, token: str, end: int, lattice: dict) -> tuple:
+        """
+            Node of the lattice at an offset of the token, memoized in `lattice`: the analysis ending at the
+            offset if its prefix is a root, and the suffixes ending at the offset in the order they are tried.
+        """
+        if end not in lattice:
+            root, terminal = token[:end], None
+
+            if root in self.lexicon:
+                terminal = (root, [])
+            else:
+                norm = self.normalize_word(root)
+
+                if norm in self.lexicon:
+                    terminal = (norm, ["Dativ"] if root[-1] in "ae" else ["Accusative"] if root[-1] in "ıiuü" else [])
+
+            # a single backwards walk from the offset finds every suffix ending there
+            node, edges = self.suffix_trie, []
+            for i in range(end - 1, -1, -1):
+                node = node.get(token[i])
+                if node is None:
+                    break
+
+                edges += node.get(None, [])
+
+            lattice[end] = (terminal, sorted(edges))
+
+        return lattice[end]
+
+
+    def iter_analyses(self, token: str):
+        """
+            Lazily enumerates every analysis of the token as (root, categories) with a lexicon root, the
+            categories of the last suffix first. The lattice keeps only the root and the suffixes of every
+            offset, and the offsets that cannot reach a root are never entered.
+        """
+        lattice, reachable = {}, []
+
+        for end in range(len(token) + 1):
+            terminal, edges = self.__lattice_node__(token, end, lattice)
+            reachable.append(terminal is not None or any(reachable[end - length] for _, length, _ in edges))
+
+        def walk(end, path):
+            terminal, edges = lattice[end]
+
+            if terminal is not None:
+                yield terminal[0], path + terminal[1]
+
+            for _, length, category in edges:
+                if reachable[end - length]:
+                    path.append(category)
+                    yield from walk(end - length, path)
+                    path.pop()
+
+        # different segmentations can give the same root and categories
+        seen = set()
+        for root, categories in walk(len(token), []):
+            if (root, tuple(categories)) not in seen:
+                seen.add((root, tuple(categories)))
+                yield root, categories
+
+
+    def analyze(self, token: str, limit: int = None) -> list[(str, list)]:
+        "Analyses of the token in the order of iter_analyses, at most `limit` of them."
+        return list(itertools.islice(self.iter_analyses(token), limit))
+
+
     def stem(self, token: str) -> str:
         if self.include_categories:
             return self.stem_to_categories(token, [])
@@ -78,36 +248,54 @@ class TurkishStemmer:
             return self.stem_to_word(token)
 
     def stem_to_categories(self, token: str, categories: list[str]) -> list[str, list]:
-        # termination
-        if token in self.lexicon:
-            return token, categories
-        elif self.normalize_word(token) in self.lexicon:
-            if token[-1] in "ae":
-                categories.append("Dativ")
-            elif token[-1] in "ıiuü":
-                categories.append("Accusative")
+        # following the first suffix of every node of the lattice until a root is reached
+        lattice, end = {}, len(token)
 
-            return self.normalize_word(token), categories
+        while True:
+            terminal, edges = self.__lattice_node__(token, end, lattice)
 
-        # recursion
-        for suffixes in self.suffixes:
-            for suffix in suffixes:
-                (suffix, category) = (suffix[0], suffix[1])
-                suffix_len = len(suffix)
+            # termination
+            if terminal is not None:
+                categories.extend(terminal[1])
+                return terminal[0], categories
+
+            if len(edges) == 0:
+                return token[:end], categories
+
+            _, length, category = edges[0]
+            categories.append(category)
+            end -= length
+
+
+    def analyze_batch(self, tokens: list[str]) -> list[(str, bytes)]:
+        """
+            Stems of the tokens as in stem_to_categories, with the categories encoded as bytes of category ids.
+            Repeated tokens are stemmed once and share their result.
+        """
+        analyses = {}
+
+        for token in tokens:
+            if token not in analyses:
+                root, categories = self.stem_to_categories(token, [])
+                analyses[token] = (root, bytes(self.category_ids[category] for category in categories))
+
+        return [analyses[token] for token in tokens]
 
-                if suffix == token[-suffix_len:]:
-                    categories.append(category)
-                    return self.stem_to_categories(token[:-suffix_len], categories)
 
-        return token, categories
+    def category_names(self, ids: bytes) -> list[str]:
+        return [self.categories[i] for i in ids]
 
 
     def stem_to_word(self, token: str) -> str:
         # termination
         if token in self.lexicon:
             return token
-        elif self.normalize_word(token) in self.lexicon:
-            return self.normalize_word(token)
+
+        # normalizing once per token
+        norm = self.normalize_word(token)
+
+        if norm in self.lexicon:
+            return norm
 
         # recursion
         for suffixes in self.suffixes:
@@ -132,18 +320,16 @@ class TurkishStemmer:
 
 
     # This code is written based on Peter Norvig's spell corrector: https://norvig.com/spell-correct.html
-    def edits1(self, word: str) -> list[str]:
-        "All edits that are one edit away from `word`."
-        letters    = 'abcçdefgğhijklmnoöpqrsştuüvwxyz'
-        splits     = [(word[:i], word[i:])    for i in range(len(word) + 1)]
-        deletes    = [L + R[1:]               for L, R in splits if R]
-        replaces   = [L + c + R[1:]           for L, R in splits if R for c in letters]
-        return set(deletes + replaces)
-
     def normalize_word(self, word: str) -> str:
-        E1 = list(self.edits1(word))
-        cands = {var: self.lexicon[var] for var in E1}
-        cands = {c: cands[c] for c in cands if cands[c] > 0}
-        cands = sorted(cands.items(), key=lambda i:i[1], reverse=True)
-
-        return cands[0][0] if len(cands) > 0 else word
+        "Most frequent lexicon word one deletion or replacement away from `word`, found with a few probes."
+        # deleting a letter of the word
+        cands = {word[:i] + word[i+1:] for i in range(len(word))}
+        cands = {c for c in cands if self.lexicon[c] > 0}
+
+        # replacing a letter of the word, the lexicon words sharing the masked key differ only at the mask
+        for i in range(len(word)):
+            for cand in self.mask_index.get(word[:i] + "\0" + word[i+1:], ()):
+                if cand[i] in LETTERS:
+                    cands.add(cand)
+
+        return max(cands, key=lambda c: self.lexicon[c]) if len(cands) > 0 else word
@@ -10,6 +10,7 @@ parser.add_argument('-grammar_path', default="./data/grammar.json", type=str, he
 parser.add_argument('-lexicon_path', default="./data/lexicon.txt", type=str, help="path of the lexicon file")
 parser.add_argument('-suffixes_path', default="./data/suffix_rules.json", type=str, help="path of the suffixes file")
 parser.add_argument('-corpus_path', default="./data/corpus.txt", type=str, help="path of the corpus file for the stemmer")
+parser.add_argument('-stemmer_artifact_path', default=None, type=str, help="path of the compiled suffixes, lexicon and corpus counts of the stemmer")
 
 args = parser.parse_args()
 
@@ -76,7 +77,8 @@ if __name__ == "__main__":
                         "suffixes_path": args.suffixes_path,
                         "corpus_path": args.corpus_path,
                         "include_categories": True,
-                        "use_derivational": False}
+                        "use_derivational": False,
+                        "artifact_path": args.stemmer_artifact_path}
 
         turkishCFG = TurkishContextFreeGrammar(args.grammar_path, morphological_analyzer_strategy="stemmer",
                                                stemmer_args=stemmer_args)